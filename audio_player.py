@@ -5,12 +5,44 @@ Audio Player Module for TTS GUI
 Module phát audio cho GUI TTS
 """
 
-import pygame
+import logging
+import os
+import shutil
+import signal
+import subprocess
 import threading
+import pygame
+import array
+import queue
 import time
+import warnings
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Optional, Callable, List
 from enum import Enum
+from mutagen.mp3 import MP3
+
+try:
+    import miniaudio  # Optional low-latency backend / Backend độ trễ thấp (tùy chọn)
+except ImportError:
+    miniaudio = None
+
+# C-level volume scaling for the miniaudio callback: numpy, else audioop (Python < 3.13)
+# Nhân âm lượng bằng C trong callback miniaudio: numpy, không có thì audioop (Python < 3.13)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+if np is None:
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            import audioop
+    except ImportError:
+        audioop = None
+else:
+    audioop = None
+
+logger = logging.getLogger(__name__)
 
 
 class PlayerState(Enum):
@@ -20,32 +52,146 @@ class PlayerState(Enum):
     PAUSED = "paused"
 
 
-class AudioPlayer:
+# Queued marker for "playback finished" / Đánh dấu "phát xong" trong hàng đợi
+_PLAYBACK_FINISHED = object()
+
+
+def _scale_samples(samples: array.array, volume: float):
     """
-    Audio player with play/pause/stop controls
-    Trình phát audio với điều khiển play/pause/stop
+    Scale signed 16-bit samples by volume (0.0 to 1.0) in one bulk pass
+    Nhân âm lượng cho mẫu 16-bit có dấu trong một lượt
+    """
+    if np is not None:
+        return (np.frombuffer(samples, dtype=np.int16) * volume).astype(np.int16)
+    if audioop is not None:
+        return audioop.mul(samples.tobytes(), 2, volume)
+    return array.array('h', [int(sample * volume) for sample in samples])
+
+
+class BaseAudioPlayer:
+    """
+    Backend-independent player state and callbacks
+    Trạng thái và callback dùng chung cho mọi backend phát audio
     """
     
     def __init__(self):
-        """Initialize audio player / Khởi tạo player"""
-        # Initialize pygame mixer / Khởi tạo pygame mixer
-        pygame.mixer.init()
-        
+        """Initialize shared state / Khởi tạo trạng thái chung"""
         # State variables / Biến trạng thái
         self.state = PlayerState.STOPPED
         self.current_file: Optional[Path] = None
         self.volume = 1.0  # 0.0 to 1.0
         self.duration = 0.0  # Duration in seconds
-        self.start_time = 0.0
-        self.pause_time = 0.0
         
         # Callbacks / Hàm callback
         self.on_finish_callback: Optional[Callable] = None
         self.on_state_change_callback: Optional[Callable[[PlayerState], None]] = None
         
-        # Monitor thread / Thread giám sát
-        self.monitor_thread: Optional[threading.Thread] = None
-        self.should_monitor = False
+        # Notifications for the UI thread (C-level, lock-free fast path)
+        # Thông báo chuyển sang luồng giao diện
+        self._event_queue = queue.SimpleQueue()
+    
+    def get_progress(self) -> float:
+        """
+        Get playback progress as percentage
+        Lấy tiến trình phát (%)
+        
+        Returns:
+            Progress 0.0 to 1.0
+        """
+        if self.duration > 0:
+            return min(1.0, self.get_position() / self.duration)
+        return 0.0
+    
+    def is_playing(self) -> bool:
+        """Check if currently playing / Kiểm tra có đang phát không"""
+        return self.state == PlayerState.PLAYING
+    
+    def set_on_finish_callback(self, callback: Callable):
+        """
+        Set callback when playback finishes
+        Đặt callback khi phát xong
+        """
+        self.on_finish_callback = callback
+    
+    def set_on_state_change_callback(self, callback: Callable[[PlayerState], None]):
+        """
+        Set callback when state changes
+        Đặt callback khi trạng thái thay đổi
+        """
+        self.on_state_change_callback = callback
+    
+    def _update_state(self, new_state: PlayerState):
+        """Update player state / Cập nhật trạng thái"""
+        self.state = new_state
+        self._event_queue.put_nowait(new_state)
+    
+    def drain_events(self):
+        """
+        Run queued callbacks on the calling (UI) thread, call from the GUI loop
+        Chạy các callback đang chờ trên luồng gọi (luồng giao diện)
+        """
+        self.pump_events()
+        while True:
+            try:
+                event = self._event_queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if event is _PLAYBACK_FINISHED:
+                if self.on_finish_callback:
+                    self.on_finish_callback()
+            elif self.on_state_change_callback:
+                self.on_state_change_callback(event)
+    
+    def pump_events(self):
+        """
+        Poll the backend for end of playback (called by drain_events)
+        Kiểm tra backend đã phát xong chưa (gọi từ drain_events)
+        """
+    
+    def _finish(self):
+        """Playback reached the end / Phát đến cuối bài"""
+        self._update_state(PlayerState.STOPPED)
+        self._event_queue.put_nowait(_PLAYBACK_FINISHED)
+    
+    def cleanup(self):
+        """
+        Cleanup resources
+        Dọn dẹp tài nguyên
+        """
+        self.stop()
+
+
+class AudioPlayer(BaseAudioPlayer):
+    """
+    Audio player with play/pause/stop controls
+    Trình phát audio với điều khiển play/pause/stop
+    """
+    
+    # SDL event posted by pygame when a track ends / Sự kiện SDL khi phát hết bài
+    END_EVENT = pygame.USEREVENT + 0xA0
+    
+    # Reuse a get_busy() answer within one UI frame / Dùng lại get_busy() trong 1 khung hình
+    BUSY_CACHE_SECONDS = 0.016
+    
+    def __init__(self):
+        """Initialize audio player / Khởi tạo player"""
+        # Initialize pygame mixer / Khởi tạo pygame mixer
+        super().__init__()
+        pygame.mixer.init()
+        
+        # The SDL event queue lives in the video subsystem (no window is opened)
+        # Hàng đợi sự kiện SDL thuộc video subsystem (không mở cửa sổ)
+        try:
+            pygame.display.init()
+            self.events_available = True
+        except pygame.error:
+            self.events_available = False
+        
+        self.start_time = 0.0
+        self.pause_time = 0.0
+        self._paused_accum = 0.0  # Total paused seconds / Tổng thời gian tạm dừng
+        self._busy_cache = (0.0, False)  # (checked_at, busy)
     
     def load(self, audio_path: str) -> bool:
         """
@@ -63,23 +209,26 @@ class AudioPlayer:
             
             audio_file = Path(audio_path)
             if not audio_file.exists():
-                print(f"❌ File không tồn tại: {audio_path}")
+                logger.error(f"❌ File không tồn tại: {audio_path}")
                 return False
             
             # Load audio / Tải audio
             pygame.mixer.music.load(str(audio_file))
             self.current_file = audio_file
             
-            # Get duration (pygame doesn't provide this directly, use estimate)
-            # For accurate duration, would need mutagen or other library
-            file_size = audio_file.stat().st_size
-            self.duration = file_size / 24000  # Rough estimate for MP3
+            # Get duration from the MP3 header (Xing/LAME info for VBR)
+            # Lấy thời lượng từ header MP3, ước lượng theo dung lượng nếu lỗi
+            try:
+                self.duration = MP3(str(audio_file)).info.length
+            except Exception:
+                file_size = audio_file.stat().st_size
+                self.duration = file_size / 24000  # Rough estimate for MP3
             
             self._update_state(PlayerState.STOPPED)
             return True
             
         except Exception as e:
-            print(f"❌ Lỗi khi load audio: {e}")
+            logger.error(f"❌ Lỗi khi load audio: {e}")
             return False
     
     def play(self) -> bool:
@@ -94,21 +243,25 @@ class AudioPlayer:
             if self.state == PlayerState.PAUSED:
                 # Resume / Tiếp tục
                 pygame.mixer.music.unpause()
+                self._paused_accum += time.monotonic() - self.pause_time
                 self._update_state(PlayerState.PLAYING)
             else:
                 # Start playing / Bắt đầu phát
+                if self.events_available:
+                    # Drop end events left over from a previous stop()
+                    pygame.event.clear(self.END_EVENT)
+                pygame.mixer.music.set_endevent(self.END_EVENT)
                 pygame.mixer.music.set_volume(self.volume)
                 pygame.mixer.music.play()
-                self.start_time = time.time()
+                self.start_time = time.monotonic()
+                self._paused_accum = 0.0
+                self._busy_cache = (0.0, False)
                 self._update_state(PlayerState.PLAYING)
-                
-                # Start monitor thread / Bắt đầu thread giám sát
-                self._start_monitor()
             
             return True
             
         except Exception as e:
-            print(f"❌ Lỗi khi phát audio: {e}")
+            logger.error(f"❌ Lỗi khi phát audio: {e}")
             return False
     
     def pause(self) -> bool:
@@ -122,12 +275,12 @@ class AudioPlayer:
         try:
             if self.state == PlayerState.PLAYING:
                 pygame.mixer.music.pause()
-                self.pause_time = time.time()
+                self.pause_time = time.monotonic()
                 self._update_state(PlayerState.PAUSED)
             return True
             
         except Exception as e:
-            print(f"❌ Lỗi khi tạm dừng: {e}")
+            logger.error(f"❌ Lỗi khi tạm dừng: {e}")
             return False
     
     def stop(self) -> bool:
@@ -142,13 +295,13 @@ class AudioPlayer:
             pygame.mixer.music.stop()
             self.unload()  # Unload file to release it
             self._update_state(PlayerState.STOPPED)
-            self._stop_monitor()
             self.start_time = 0.0
             self.pause_time = 0.0
+            self._paused_accum = 0.0
             return True
             
         except Exception as e:
-            print(f"❌ Lỗi khi dừng: {e}")
+            logger.error(f"❌ Lỗi khi dừng: {e}")
             return False
     
     def unload(self):
@@ -160,7 +313,7 @@ class AudioPlayer:
             pygame.mixer.music.unload()
             self.current_file = None
         except Exception as e:
-            print(f"⚠️ Lỗi khi unload: {e}")
+            logger.warning(f"⚠️ Lỗi khi unload: {e}")
     
     def set_volume(self, volume: float):
         """
@@ -181,91 +334,553 @@ class AudioPlayer:
         Returns:
             Position in seconds
         """
+        # Monotonic clock instead of get_pos(), which drifts on long MP3s
+        # Dùng đồng hồ monotonic thay cho get_pos() (bị lệch với MP3 dài)
         if self.state == PlayerState.PLAYING:
-            # pygame.mixer.music.get_pos() returns milliseconds since start
-            pos_ms = pygame.mixer.music.get_pos()
-            if pos_ms >= 0:
-                return pos_ms / 1000.0
+            return time.monotonic() - self.start_time - self._paused_accum
         elif self.state == PlayerState.PAUSED:
-            return self.pause_time - self.start_time
+            return self.pause_time - self.start_time - self._paused_accum
         
         return 0.0
     
-    def get_progress(self) -> float:
+    def handle_event(self, event) -> bool:
         """
-        Get playback progress as percentage
-        Lấy tiến trình phát (%)
+        Handle a pygame event, firing the finish callback on end of track
+        Xử lý sự kiện pygame, gọi callback khi phát hết bài
         
+        Args:
+            event: pygame event
+            
         Returns:
-            Progress 0.0 to 1.0
+            True if the event belonged to the player
         """
-        if self.duration > 0:
-            return min(1.0, self.get_position() / self.duration)
-        return 0.0
+        if event.type != self.END_EVENT:
+            return False
+        
+        # stop() also posts the end event, only a playing track can finish
+        if self.state == PlayerState.PLAYING:
+            self._finish()
+        return True
     
-    def is_playing(self) -> bool:
-        """Check if currently playing / Kiểm tra có đang phát không"""
-        return self.state == PlayerState.PLAYING
+    def pump_events(self):
+        """Dispatch the SDL end event / Xử lý sự kiện kết thúc từ SDL"""
+        if self.events_available:
+            for event in pygame.event.get():
+                self.handle_event(event)
+        elif self.state == PlayerState.PLAYING and not self._is_busy():
+            self._finish()
     
-    def set_on_finish_callback(self, callback: Callable):
+    def wait_until_done(self):
         """
-        Set callback when playback finishes
-        Đặt callback khi phát xong
+        Block until the current track finishes (for use without a GUI loop)
+        Chờ đến khi phát xong (dùng khi không có vòng lặp GUI)
         """
-        self.on_finish_callback = callback
+        while self.state == PlayerState.PLAYING:
+            if self.events_available:
+                self.handle_event(pygame.event.wait())
+            else:
+                pygame.time.wait(100)
+                self.pump_events()
+        self.drain_events()
     
-    def set_on_state_change_callback(self, callback: Callable[[PlayerState], None]):
+    def _is_busy(self) -> bool:
         """
-        Set callback when state changes
-        Đặt callback khi trạng thái thay đổi
+        pygame.mixer.music.get_busy() memoized for BUSY_CACHE_SECONDS
+        get_busy() được nhớ tạm trong BUSY_CACHE_SECONDS
         """
-        self.on_state_change_callback = callback
+        now = time.monotonic()
+        checked_at, busy = self._busy_cache
+        if now - checked_at > self.BUSY_CACHE_SECONDS:
+            busy = pygame.mixer.music.get_busy()
+            self._busy_cache = (now, busy)
+        return busy
     
-    def _update_state(self, new_state: PlayerState):
-        """Update player state / Cập nhật trạng thái"""
-        self.state = new_state
-        if self.on_state_change_callback:
-            self.on_state_change_callback(new_state)
+    def cleanup(self):
+        """
+        Cleanup resources
+        Dọn dẹp tài nguyên
+        """
+        self.stop()
+        pygame.mixer.quit()
+
+
+class MiniaudioPlayer(BaseAudioPlayer):
+    """
+    Low-latency player streaming through a miniaudio playback device
+    Trình phát độ trễ thấp dùng thiết bị phát của miniaudio
+    """
     
-    def _start_monitor(self):
-        """Start monitoring thread / Bắt đầu thread giám sát"""
-        self.should_monitor = True
-        self.monitor_thread = threading.Thread(target=self._monitor_playback, daemon=True)
-        self.monitor_thread.start()
+    def __init__(self):
+        """Initialize miniaudio player / Khởi tạo player miniaudio"""
+        if miniaudio is None:
+            raise RuntimeError("Chưa cài đặt miniaudio")
+        super().__init__()
+        
+        self.device = None
+        self._stream = None
+        self._sample_rate = 0
+        self._channels = 0
+        self._frames_played = 0  # Written only by the audio thread
+        self._ended = False
     
-    def _stop_monitor(self):
-        """Stop monitoring thread / Dừng thread giám sát"""
-        self.should_monitor = False
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=1.0)
+    def load(self, audio_path: str) -> bool:
+        """
+        Load audio file
+        Tải file audio
+        
+        Args:
+            audio_path: Path to audio file
+            
+        Returns:
+            True if successful
+        """
+        try:
+            self.stop()
+            
+            audio_file = Path(audio_path)
+            if not audio_file.exists():
+                logger.error(f"❌ File không tồn tại: {audio_path}")
+                return False
+            
+            # Play at the file's own rate and layout, no resampling
+            info = miniaudio.get_file_info(str(audio_file))
+            self.current_file = audio_file
+            self.duration = info.duration
+            self._sample_rate = info.sample_rate
+            self._channels = info.nchannels
+            
+            self._update_state(PlayerState.STOPPED)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi load audio: {e}")
+            return False
     
-    def _monitor_playback(self):
+    def play(self) -> bool:
         """
-        Monitor playback and detect when it finishes
-        Giám sát phát và phát hiện khi kết thúc
+        Play or resume audio
+        Phát hoặc tiếp tục audio
+        
+        Returns:
+            True if successful
         """
-        while self.should_monitor:
-            time.sleep(0.1)  # Check every 100ms
+        try:
+            if self.state == PlayerState.PAUSED:
+                # Resume the same stream / Tiếp tục stream cũ
+                self.device.start(self._stream)
+            else:
+                if self.current_file is None:
+                    return False
+                self._close_device()
+                
+                source = miniaudio.stream_file(
+                    str(self.current_file),
+                    output_format=miniaudio.SampleFormat.SIGNED16,
+                    nchannels=self._channels,
+                    sample_rate=self._sample_rate
+                )
+                self._frames_played = 0
+                self._ended = False
+                self._stream = self._counting_stream(source)
+                next(self._stream)
+                
+                self.device = miniaudio.PlaybackDevice(
+                    output_format=miniaudio.SampleFormat.SIGNED16,
+                    nchannels=self._channels,
+                    sample_rate=self._sample_rate
+                )
+                self.device.start(self._stream)
             
+            self._update_state(PlayerState.PLAYING)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi phát audio: {e}")
+            return False
+    
+    def pause(self) -> bool:
+        """
+        Pause audio
+        Tạm dừng audio
+        
+        Returns:
+            True if successful
+        """
+        try:
             if self.state == PlayerState.PLAYING:
-                # Check if music has stopped (finished)
-                if not pygame.mixer.music.get_busy():
-                    self._update_state(PlayerState.STOPPED)
-                    if self.on_finish_callback:
-                        self.on_finish_callback()
-                    break
+                self.device.stop()
+                self._update_state(PlayerState.PAUSED)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi tạm dừng: {e}")
+            return False
     
-    def cleanup(self):
+    def stop(self) -> bool:
         """
-        Cleanup resources
-        Dọn dẹp tài nguyên
+        Stop audio
+        Dừng audio
+        
+        Returns:
+            True if successful
         """
-        self.stop()
-        pygame.mixer.quit()
+        try:
+            self.unload()
+            self._update_state(PlayerState.STOPPED)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi dừng: {e}")
+            return False
+    
+    def unload(self):
+        """
+        Unload current audio file to release file handle
+        Giải phóng file audio để có thể ghi đè
+        """
+        try:
+            self._close_device()
+            self.current_file = None
+        except Exception as e:
+            logger.warning(f"⚠️ Lỗi khi unload: {e}")
+    
+    def set_volume(self, volume: float):
+        """
+        Set playback volume
+        Đặt âm lượng phát
+        
+        Args:
+            volume: 0.0 to 1.0
+        """
+        self.volume = max(0.0, min(1.0, volume))
+    
+    def get_position(self) -> float:
+        """
+        Get current playback position in seconds
+        Lấy vị trí phát hiện tại (giây)
+        
+        Returns:
+            Position in seconds
+        """
+        if self.state == PlayerState.STOPPED or not self._sample_rate:
+            return 0.0
+        return self._frames_played / self._sample_rate
+    
+    def pump_events(self):
+        """Report the end of the stream / Báo khi stream kết thúc"""
+        if self._ended and self.state == PlayerState.PLAYING:
+            # The device must not be stopped from its own audio callback
+            self._close_device()
+            self._finish()
+    
+    def _counting_stream(self, source):
+        """
+        Wrap a miniaudio stream, counting frames and applying volume (audio thread)
+        Bọc stream miniaudio, đếm frame và áp dụng âm lượng (luồng audio)
+        """
+        required_frames = yield b""
+        while True:
+            try:
+                samples = source.send(required_frames)
+            except StopIteration:
+                self._ended = True
+                return
+            
+            self._frames_played += len(samples) // self._channels
+            volume = self.volume
+            if volume < 1.0:
+                samples = _scale_samples(samples, volume)
+            required_frames = yield samples
+    
+    def _close_device(self):
+        """Close playback device and stream / Đóng thiết bị phát và stream"""
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class SubprocessPlayer(BaseAudioPlayer):
+    """
+    Preview player that runs a command-line player (POSIX only)
+    Trình phát nghe thử dùng chương trình phát dòng lệnh (chỉ POSIX)
+    """
+    
+    # Command-line players in order of preference; both can start mid-file, which
+    # a live volume change needs (without them pygame is used)
+    # Thứ tự ưu tiên các chương trình phát; cả hai đều phát được từ giữa file,
+    # cần cho việc đổi âm lượng khi đang phát (không có thì dùng pygame)
+    COMMANDS = ('ffplay', 'mpg123')
+    
+    # Wait this long after the last volume change before restarting the player,
+    # so dragging the slider does not spawn a process per step
+    # Chờ sau lần đổi âm lượng cuối rồi mới khởi động lại, tránh tạo tiến trình
+    # mới ở mỗi bước kéo slider
+    VOLUME_RESTART_DELAY = 0.15
+    
+    def __init__(self):
+        """Initialize subprocess player / Khởi tạo player dùng subprocess"""
+        if os.name != 'posix':
+            raise RuntimeError("Chỉ hỗ trợ POSIX")
+        
+        self.command = next((cmd for cmd in self.COMMANDS if shutil.which(cmd)), None)
+        if self.command is None:
+            raise RuntimeError("Không tìm thấy chương trình phát audio")
+        super().__init__()
+        
+        self._proc: Optional[subprocess.Popen] = None
+        self._ended = False
+        self.start_time = 0.0
+        self.pause_time = 0.0
+        self._paused_accum = 0.0  # Total paused seconds / Tổng thời gian tạm dừng
+        self._frame_seconds = 1152 / 44100  # MP3 frame length, for mpg123 seeking
+        self._volume_changed_at: Optional[float] = None  # Pending volume restart
+    
+    def load(self, audio_path: str) -> bool:
+        """
+        Load audio file
+        Tải file audio
+        
+        Args:
+            audio_path: Path to audio file
+            
+        Returns:
+            True if successful
+        """
+        try:
+            self.stop()
+            
+            audio_file = Path(audio_path)
+            if not audio_file.exists():
+                logger.error(f"❌ File không tồn tại: {audio_path}")
+                return False
+            
+            self.current_file = audio_file
+            try:
+                info = MP3(str(audio_file)).info
+                self.duration = info.length
+                # Layer III frames hold 1152 samples (MPEG-1) or 576 (MPEG-2/2.5)
+                self._frame_seconds = (1152 if info.version == 1 else 576) / info.sample_rate
+            except Exception:
+                self.duration = audio_file.stat().st_size / 24000  # Rough estimate for MP3
+            
+            self._update_state(PlayerState.STOPPED)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi load audio: {e}")
+            return False
+    
+    def play(self) -> bool:
+        """
+        Play or resume audio
+        Phát hoặc tiếp tục audio
+        
+        Returns:
+            True if successful
+        """
+        try:
+            if self.state == PlayerState.PAUSED and self._proc is not None:
+                # Resume the stopped process / Tiếp tục tiến trình đang dừng
+                self._proc.send_signal(signal.SIGCONT)
+                self._paused_accum += time.monotonic() - self.pause_time
+            elif self.state == PlayerState.PAUSED:
+                # Volume changed while paused: restart where it paused
+                # Đổi âm lượng khi tạm dừng: phát lại từ chỗ đã dừng
+                self._start_process(self.get_position())
+            else:
+                if self.current_file is None:
+                    return False
+                self._start_process(0.0)
+            
+            self._update_state(PlayerState.PLAYING)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi phát audio: {e}")
+            return False
+    
+    def pause(self) -> bool:
+        """
+        Pause audio
+        Tạm dừng audio
+        
+        Returns:
+            True if successful
+        """
+        try:
+            if self.state == PlayerState.PLAYING and self._proc is not None:
+                self._proc.send_signal(signal.SIGSTOP)
+                self.pause_time = time.monotonic()
+                self._update_state(PlayerState.PAUSED)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi tạm dừng: {e}")
+            return False
+    
+    def stop(self) -> bool:
+        """
+        Stop audio
+        Dừng audio
+        
+        Returns:
+            True if successful
+        """
+        try:
+            self._kill_process()
+            self._update_state(PlayerState.STOPPED)
+            self.start_time = 0.0
+            self.pause_time = 0.0
+            self._paused_accum = 0.0
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi dừng: {e}")
+            return False
+    
+    def unload(self):
+        """
+        Unload current audio file to release file handle
+        Giải phóng file audio để có thể ghi đè
+        """
+        try:
+            self._kill_process()
+            self.current_file = None
+        except Exception as e:
+            logger.warning(f"⚠️ Lỗi khi unload: {e}")
+    
+    def set_volume(self, volume: float):
+        """
+        Set playback volume; a running player is restarted at the current
+        position shortly after the last change (see pump_events)
+        Đặt âm lượng phát; chương trình đang phát được khởi động lại tại vị trí
+        hiện tại ngay sau lần đổi cuối (xem pump_events)
+        
+        Args:
+            volume: 0.0 to 1.0
+        """
+        volume = max(0.0, min(1.0, volume))
+        if volume == self.volume:
+            return
+        self.volume = volume
+        if self._proc is not None:
+            self._volume_changed_at = time.monotonic()
+    
+    def get_position(self) -> float:
+        """
+        Get current playback position in seconds
+        Lấy vị trí phát hiện tại (giây)
+        
+        Returns:
+            Position in seconds
+        """
+        if self.state == PlayerState.PLAYING:
+            return time.monotonic() - self.start_time - self._paused_accum
+        elif self.state == PlayerState.PAUSED:
+            return self.pause_time - self.start_time - self._paused_accum
+        return 0.0
+    
+    def pump_events(self):
+        """
+        Report the end of playback and apply a pending volume change
+        Báo khi phát xong và áp dụng âm lượng mới đang chờ
+        """
+        if self._ended and self.state == PlayerState.PLAYING:
+            self._ended = False
+            self._proc = None
+            self._volume_changed_at = None
+            self._finish()
+            return
+        
+        changed_at = self._volume_changed_at
+        if changed_at is None or time.monotonic() - changed_at < self.VOLUME_RESTART_DELAY:
+            return
+        self._volume_changed_at = None
+        if self.state == PlayerState.PLAYING:
+            self._start_process(self.get_position())
+        elif self.state == PlayerState.PAUSED:
+            # play() restarts at the paused position / play() phát lại từ chỗ tạm dừng
+            self._kill_process()
+    
+    def _start_process(self, offset: float):
+        """
+        Start the player offset seconds into the file
+        Chạy chương trình phát từ giây thứ offset của file
+        """
+        self._kill_process()
+        
+        proc = subprocess.Popen(
+            self._command_line(offset),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self._proc = proc
+        self.start_time = time.monotonic() - offset
+        self._paused_accum = 0.0
+        
+        # Block on the child instead of polling it / Chờ tiến trình con thay vì thăm dò
+        threading.Thread(target=self._wait_process, args=(proc,), daemon=True).start()
+    
+    def _command_line(self, offset: float = 0.0) -> List[str]:
+        """
+        Build the player command with volume and start position
+        Tạo lệnh phát kèm âm lượng và vị trí bắt đầu
+        """
+        path = str(self.current_file)
+        if self.command == 'ffplay':
+            return ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet',
+                    '-volume', str(int(self.volume * 100)), '-ss', f'{offset:.3f}', path]
+        return ['mpg123', '-q', '-f', str(int(self.volume * 32768)),
+                '-k', str(int(offset / self._frame_seconds)), path]
+    
+    def _wait_process(self, proc: subprocess.Popen):
+        """Wait for the player to exit (watcher thread) / Chờ chương trình phát kết thúc"""
+        proc.wait()
+        if self._proc is proc:
+            self._ended = True
+    
+    def _kill_process(self):
+        """Terminate the running player / Dừng chương trình phát đang chạy"""
+        proc, self._proc = self._proc, None
+        self._ended = False
+        self._volume_changed_at = None
+        if proc is None or proc.poll() is not None:
+            return
+        
+        proc.terminate()
+        # A stopped process only acts on SIGTERM once continued
+        proc.send_signal(signal.SIGCONT)
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def create_audio_player() -> BaseAudioPlayer:
+    """
+    Create the lowest-latency player available
+    Tạo trình phát có độ trễ thấp nhất hiện có
+    """
+    if miniaudio is not None:
+        try:
+            return MiniaudioPlayer()
+        except Exception as e:
+            logger.warning(f"⚠️ Không dùng được miniaudio: {e}")
+    try:
+        return SubprocessPlayer()
+    except Exception as e:
+        logger.info(f"Không dùng được trình phát dòng lệnh, chuyển sang pygame: {e}")
+    return AudioPlayer()
 
 
 # Test the module / Kiểm tra module
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     def on_finish():
         print("✅ Phát xong!")
     
@@ -274,7 +889,7 @@ if __name__ == "__main__":
     
     # This is just a test example
     # Đây chỉ là ví dụ test
-    player = AudioPlayer()
+    player = create_audio_player()
     player.set_on_finish_callback(on_finish)
     player.set_on_state_change_callback(on_state_change)
     
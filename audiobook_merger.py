@@ -5,11 +5,54 @@ Audiobook Merger - Combine multiple MP3 chapters into one file with chapter mark
 Module gộp audiobook - Gộp nhiều chương MP3 thành 1 file với chapter markers
 """
 
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, Callable
+from typing import List, Dict, Optional, Callable, Tuple
 from pydub import AudioSegment
 from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, CTOC, CHAP, TIT2, CTOCFlags
+from mutagen.id3 import ID3, ID3NoHeaderError, CTOC, CHAP, TIT2, CTOCFlags
+
+logger = logging.getLogger(__name__)
+
+
+# Copy buffer for joining MP3 frames / Bộ đệm khi nối frame MP3
+COPY_CHUNK_SIZE = 1 << 20
+
+# Zero-copy file to file transfer (Linux only) / Chép file không qua user-space (chỉ Linux)
+USE_SENDFILE = sys.platform.startswith('linux') and hasattr(os, 'sendfile')
+
+# Free space reserved after the ID3 tag, room for later metadata edits
+# (cover art, extra chapters) without shifting the audio
+# Khoảng trống dự phòng sau tag ID3 để sửa metadata mà không dịch audio
+TAG_PADDING = 64 * 1024
+
+# MPEG Layer III header tables for walking frames and the Xing/Info/VBRI frame
+# Bảng header MPEG Layer III để duyệt frame và tìm frame Xing/Info/VBRI
+_L3_BITRATES_KBPS = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),   # MPEG-2.5
+}
+
+# Characters that must be backslash-escaped in an FFMETADATA file
+# Ký tự cần thoát bằng dấu gạch chéo ngược trong file FFMETADATA
+_FFMETADATA_SPECIAL_RE = re.compile(r'([=;#\\\n])')
+
+# Keep the ffmpeg encoder off CPU core 0 so the GUI thread stays responsive (Linux only)
+# Không cho ffmpeg chạy trên lõi CPU 0 để giao diện luôn mượt (chỉ Linux)
+PIN_ENCODER_OFF_CORE0 = hasattr(os, 'sched_setaffinity')
 
 
 class AudiobookMerger:
@@ -48,60 +91,59 @@ class AudiobookMerger:
             if progress_callback:
                 progress_callback(f"🎵 Bắt đầu gộp {len(audio_files)} chương thành audiobook...")
             
-            # Step 1: Concatenate all audio files / Bước 1: Nối tất cả file audio
-            combined_audio = AudioSegment.empty()
-            chapter_info = []
-            current_position_ms = 0
+            # Step 1: Read chapter headers / Bước 1: Đọc header từng chương
+            # Header reads are I/O bound, so fetch them concurrently
+            with ThreadPoolExecutor(max_workers=max(1, min(32, len(audio_files)))) as executor:
+                probes = list(executor.map(self._probe_chapter, audio_files))
+            
+            chapters = []
             
-            for idx, audio_file in enumerate(audio_files, 1):
+            for idx, (audio_file, probe) in enumerate(zip(audio_files, probes), 1):
                 if progress_callback:
                     progress_callback(f"  [{idx}/{len(audio_files)}] Thêm: {audio_file['title']}")
                 
-                # Load audio segment
-                audio_path = Path(audio_file['path'])
-                if not audio_path.exists():
+                if probe is None:
                     if progress_callback:
-                        progress_callback(f"  ⚠️ Bỏ qua (file không tồn tại): {audio_path.name}")
+                        progress_callback(f"  ⚠️ Bỏ qua (file không tồn tại): {Path(audio_file['path']).name}")
                     continue
                 
-                segment = AudioSegment.from_mp3(str(audio_path))
-                duration_ms = len(segment)
-                
-                # Store chapter info
-                chapter_info.append({
-                    'id': audio_file['id'],
-                    'title': audio_file['title'],
-                    'start_ms': current_position_ms,
-                    'end_ms': current_position_ms + duration_ms,
-                    'duration_ms': duration_ms
-                })
-                
-                # Add to combined audio
-                combined_audio += segment
-                current_position_ms += duration_ms
+                chapters.append((audio_file,) + probe)
             
-            if len(chapter_info) == 0:
+            if len(chapters) == 0:
                 return {
                     'success': False,
                     'error': 'Không có file audio hợp lệ để gộp'
                 }
             
-            # Step 2: Export combined audio / Bước 2: Export audio đã gộp
-            if progress_callback:
-                progress_callback(f"💾 Đang lưu file audiobook ({len(chapter_info)} chương)...")
-            
+            # Step 2: Join audio / Bước 2: Nối audio
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-            combined_audio.export(
-                output_path,
-                format="mp3",
-                bitrate="128k"
-            )
             
-            # Step 3: Add chapter markers / Bước 3: Thêm chapter markers
-            if progress_callback:
-                progress_callback(f"📑 Đang thêm {len(chapter_info)} chapter markers...")
+            if self._same_stream_format([chapter[2] for chapter in chapters]):
+                # Same TTS pipeline output: copy MPEG frames as-is, no decode.
+                # Chapter times are known up front, so the tag is written first.
+                if progress_callback:
+                    progress_callback(f"💾 Đang nối trực tiếp file audiobook ({len(chapters)} chương)...")
+                    progress_callback(f"📑 Đang thêm {len(chapters)} chapter markers...")
+                chapter_info = self._concat_mp3_frames(chapters, output_path)
+            else:
+                if progress_callback:
+                    progress_callback(f"💾 Các chương khác định dạng, đang mã hóa lại ({len(chapters)} chương)...")
+                if shutil.which('ffmpeg'):
+                    # ffmpeg writes the chapter markers in the same pass
+                    # ffmpeg ghi chapter markers trong cùng lần chạy
+                    if progress_callback:
+                        progress_callback(f"📑 Đang thêm {len(chapters)} chapter markers...")
+                    chapter_info = self._merge_ffmpeg(chapters, output_path)
+                else:
+                    chapter_info = self._merge_reencode(chapters, output_path)
+                    
+                    # Step 3: Add chapter markers / Bước 3: Thêm chapter markers
+                    if progress_callback:
+                        progress_callback(f"📑 Đang thêm {len(chapter_info)} chapter markers...")
+                    
+                    self.add_chapter_markers(output_path, chapter_info)
             
-            self.add_chapter_markers(output_path, chapter_info)
+            current_position_ms = chapter_info[-1]['end_ms']
             
             # Calculate statistics / Tính toán thống kê
             total_duration_sec = current_position_ms / 1000
@@ -134,6 +176,401 @@ class AudiobookMerger:
                 'error': str(e)
             }
     
+    def _probe_chapter(self, audio_file: Dict) -> Optional[Tuple]:
+        """
+        Read stream info and audio byte range of a chapter file
+        Đọc thông tin stream và khoảng byte audio của một chương
+        
+        Returns:
+            (audio_path, mp3_info, (start, end, info_frame)) or None if the file is missing
+        """
+        audio_path = Path(audio_file['path'])
+        if not audio_path.exists():
+            return None
+        return audio_path, MP3(str(audio_path)).info, self._audio_span(audio_path)
+    
+    @staticmethod
+    def _same_stream_format(infos: List) -> bool:
+        """
+        Check that all MP3 streams can be joined frame by frame
+        Kiểm tra các stream MP3 có thể nối trực tiếp theo frame
+        """
+        first = infos[0]
+        return all(
+            info.sample_rate == first.sample_rate and info.channels == first.channels
+            for info in infos
+        )
+    
+    @staticmethod
+    def _chapter_entry(audio_file: Dict, start_ms: int, duration_ms: int) -> Dict:
+        """Build chapter info dict / Tạo thông tin chương"""
+        return {
+            'id': audio_file['id'],
+            'title': audio_file['title'],
+            'start_ms': start_ms,
+            'end_ms': start_ms + duration_ms,
+            'duration_ms': duration_ms
+        }
+    
+    def _concat_mp3_frames(self, chapters: List[Tuple], output_path: str) -> List[Dict]:
+        """
+        Join MP3 files by copying their frames, without decoding
+        Nối các file MP3 bằng cách chép frame, không giải mã
+        
+        Args:
+            chapters: List of (audio_file, audio_path, mp3_info, span) tuples
+            output_path: Path for output audiobook file
+            
+        Returns:
+            Chapter info list
+        """
+        chapter_info = []
+        position_ms = 0
+        
+        for audio_file, _, info, _ in chapters:
+            duration_ms = int(round(info.length * 1000))
+            chapter_info.append(self._chapter_entry(audio_file, position_ms, duration_ms))
+            position_ms += duration_ms
+        
+        # The chapters' own Xing/Info frames are left out of the spans; one
+        # describing the whole book goes first instead
+        # Frame Xing/Info của từng chương đã bị loại khỏi span; thay bằng một
+        # frame mô tả cả cuốn sách ở đầu file
+        info_frame = self._merged_info_frame(chapters)
+        
+        # Write the chapter tag into the empty file, then append the audio,
+        # so mutagen never has to shift the audio to make room for the tag
+        open(output_path, 'wb').close()
+        tags = ID3()
+        for frame in self._build_chapter_frames(chapter_info):
+            tags.add(frame)
+        tags.save(output_path, v1=0, padding=lambda info: TAG_PADDING)
+        
+        # Not opened in append mode: sendfile() rejects O_APPEND targets
+        with open(output_path, 'r+b') as dst:
+            dst.seek(0, os.SEEK_END)
+            dst.write(info_frame)
+            for _, audio_path, _, (start, end, _) in chapters:
+                with open(audio_path, 'rb') as src:
+                    self._copy_range(src, dst, start, end)
+        
+        return chapter_info
+    
+    def _merge_ffmpeg(self, chapters: List[Tuple], output_path: str) -> List[Dict]:
+        """
+        Join chapters with different stream formats in one ffmpeg pass,
+        writing the chapter markers from an FFMETADATA sidecar
+        Nối các chương khác định dạng bằng một lần chạy ffmpeg,
+        chapter markers lấy từ file FFMETADATA đi kèm
+        
+        Args:
+            chapters: List of (audio_file, audio_path, mp3_info, span) tuples
+            output_path: Path for output audiobook file
+            
+        Returns:
+            Chapter info list
+        """
+        chapter_info = []
+        position_ms = 0
+        
+        for audio_file, _, info, _ in chapters:
+            duration_ms = int(round(info.length * 1000))
+            chapter_info.append(self._chapter_entry(audio_file, position_ms, duration_ms))
+            position_ms += duration_ms
+        
+        # Concat demuxer input list / Danh sách file cho concat demuxer
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.txt', delete=False, encoding='utf-8'
+        ) as list_file:
+            for _, audio_path, _, _ in chapters:
+                escaped = str(audio_path.resolve()).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+        
+        # Chapter table read by ffmpeg / Bảng chương cho ffmpeg
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.txt', delete=False, encoding='utf-8'
+        ) as metadata_file:
+            metadata_file.write(self._ffmetadata_chapters(chapter_info))
+        
+        # Streams differ, so encode once to the highest rate and channel count
+        sample_rate = max(chapter[2].sample_rate for chapter in chapters)
+        channels = max(chapter[2].channels for chapter in chapters)
+        
+        try:
+            process = subprocess.Popen(
+                [
+                    'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'concat', '-safe', '0', '-i', list_file.name,
+                    '-f', 'ffmetadata', '-i', metadata_file.name,
+                    '-map', '0:a', '-map_chapters', '1',
+                    '-ar', str(sample_rate), '-ac', str(channels),
+                    '-c:a', 'libmp3lame', '-b:a', '128k',
+                    output_path
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            self._pin_off_core0(process.pid)
+            _, stderr = process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', errors='replace').strip())
+        finally:
+            os.unlink(list_file.name)
+            os.unlink(metadata_file.name)
+        
+        return chapter_info
+    
+    @staticmethod
+    def _pin_off_core0(pid: int):
+        """
+        Move a child process off CPU core 0, leaving that core to the GUI
+        Chuyển tiến trình con khỏi lõi CPU 0, dành lõi đó cho giao diện
+        
+        Args:
+            pid: Process id of the child (ffmpeg)
+        """
+        if not PIN_ENCODER_OFF_CORE0:
+            return
+        try:
+            cores = os.sched_getaffinity(pid) - {0}
+            if cores:
+                os.sched_setaffinity(pid, cores)
+        except OSError:
+            # Child already exited or affinity not permitted / Tiến trình đã thoát hoặc không có quyền
+            pass
+    
+    @staticmethod
+    def _ffmetadata_chapters(chapter_info: List[Dict]) -> str:
+        """
+        Render chapters in ffmpeg's FFMETADATA format (millisecond timebase)
+        Xuất danh sách chương theo định dạng FFMETADATA của ffmpeg (đơn vị ms)
+        """
+        lines = [';FFMETADATA1']
+        for chapter in chapter_info:
+            title = _FFMETADATA_SPECIAL_RE.sub(r'\\\1', str(chapter['title']))
+            lines += [
+                '[CHAPTER]',
+                'TIMEBASE=1/1000',
+                f"START={chapter['start_ms']}",
+                f"END={chapter['end_ms']}",
+                f"title={title}",
+            ]
+        return '\n'.join(lines) + '\n'
+    
+    def _merge_reencode(self, chapters: List[Tuple], output_path: str) -> List[Dict]:
+        """
+        Decode, join and re-encode chapters with different stream formats
+        Giải mã, nối và mã hóa lại các chương khác định dạng
+        
+        Args:
+            chapters: List of (audio_file, audio_path, mp3_info, span) tuples
+            output_path: Path for output audiobook file
+            
+        Returns:
+            Chapter info list
+        """
+        segments = [AudioSegment.from_mp3(str(audio_path)) for _, audio_path, _, _ in chapters]
+        
+        # Bring every segment to one PCM layout so the raw data can be joined
+        # Đưa mọi đoạn về cùng định dạng PCM để nối trực tiếp dữ liệu thô
+        frame_rate = max(segment.frame_rate for segment in segments)
+        channels = max(segment.channels for segment in segments)
+        sample_width = max(segment.sample_width for segment in segments)
+        segments = [
+            segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+            for segment in segments
+        ]
+        
+        chapter_info = []
+        position_ms = 0
+        
+        for (audio_file, _, _, _), segment in zip(chapters, segments):
+            duration_ms = len(segment)
+            chapter_info.append(self._chapter_entry(audio_file, position_ms, duration_ms))
+            position_ms += duration_ms
+        
+        # One join instead of N growing copies from +=
+        # Nối một lần thay vì sao chép N lần với +=
+        combined_audio = segments[0]._spawn(b''.join(segment._data for segment in segments))
+        
+        combined_audio.export(
+            output_path,
+            format="mp3",
+            bitrate="128k"
+        )
+        
+        return chapter_info
+    
+    @staticmethod
+    def _audio_span(audio_path: Path) -> Tuple[int, int, bytes]:
+        """
+        Byte range of the MPEG audio frames, skipping ID3v2 and ID3v1 tags and
+        the Xing/Info/VBRI frame, whose frame count and length describe only
+        this file and would be wrong inside a merged audiobook
+        Khoảng byte chứa frame audio MPEG, bỏ qua tag ID3v2, ID3v1 và frame
+        Xing/Info/VBRI (số frame và thời lượng trong đó chỉ đúng cho file này)
+        
+        Returns:
+            (start, end, info_frame) - info_frame is the skipped frame or b''
+        """
+        try:
+            start = ID3(str(audio_path)).size
+        except ID3NoHeaderError:
+            start = 0
+        
+        end = audio_path.stat().st_size
+        with open(audio_path, 'rb') as f:
+            f.seek(start)
+            head = f.read(64)
+            info_frame = b''
+            layout = AudiobookMerger._frame_layout(head)
+            if layout is not None:
+                frame_length, xing_offset = layout
+                if head[xing_offset:xing_offset + 4] in (b'Xing', b'Info') or head[36:40] == b'VBRI':
+                    f.seek(start)
+                    info_frame = f.read(frame_length)
+                    start += len(info_frame)
+            
+            if end - start >= 128:
+                f.seek(end - 128)
+                if f.read(3) == b'TAG':
+                    end -= 128
+        
+        return start, end, info_frame
+    
+    @staticmethod
+    def _frame_layout(header: bytes) -> Optional[Tuple[int, int]]:
+        """
+        Frame length and Xing/Info tag offset of an MPEG Layer III frame header
+        Độ dài frame và vị trí tag Xing/Info của header frame MPEG Layer III
+        
+        Args:
+            header: Bytes starting at the frame header (at least 4)
+            
+        Returns:
+            (frame_length, xing_offset), None if header is not a Layer III frame
+        """
+        if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+            return None
+        
+        version = (header[1] >> 3) & 3
+        layer = (header[1] >> 1) & 3
+        bitrate_index = header[2] >> 4
+        rate_index = (header[2] >> 2) & 3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            return None  # Reserved, free-format or not Layer III / Không phải Layer III chuẩn
+        
+        mpeg1 = version == 3
+        mono = header[3] >> 6 == 3
+        if mpeg1:
+            side_info = 17 if mono else 32
+        else:
+            side_info = 9 if mono else 17
+        crc = 0 if header[1] & 1 else 2
+        
+        bitrate = _L3_BITRATES_KBPS[1 if mpeg1 else 2][bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        padding = (header[2] >> 1) & 1
+        frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+        # Xing/Info sits right after the side info / Xing/Info nằm ngay sau side info
+        return frame_length, 4 + crc + side_info
+    
+    def _merged_info_frame(self, chapters: List[Tuple]) -> bytes:
+        """
+        Build a Xing/Info frame with the frame and byte counts of all chapters,
+        using the first chapter's Xing/Info frame as the template
+        Tạo frame Xing/Info với tổng số frame và byte của mọi chương, lấy frame
+        Xing/Info của chương đầu tiên có frame này làm mẫu
+        
+        Returns:
+            The frame, or b'' when no chapter has one (plain CBR needs none)
+        """
+        template = next((span[2] for _, _, _, span in chapters if span[2]), b'')
+        layout = self._frame_layout(template)
+        if layout is None:
+            return b''
+        _, xing_offset = layout
+        tag = template[xing_offset:xing_offset + 4]
+        if tag not in (b'Xing', b'Info'):
+            return b''  # VBRI template: not rebuilt / Mẫu VBRI: không tạo lại
+        
+        total_frames = 0
+        total_bytes = len(template)
+        for _, audio_path, _, span in chapters:
+            frames = self._count_frames(audio_path, span)
+            if frames is None:
+                return b''
+            total_frames += frames
+            total_bytes += span[1] - span[0]
+        
+        # Frames and bytes only: the TOC and the LAME extension (encoder delay,
+        # CRC) were for the template's file alone, so they are zeroed
+        # Chỉ giữ số frame và số byte: TOC và phần mở rộng LAME chỉ đúng cho
+        # file mẫu nên được xóa về 0
+        body = tag + struct.pack('>III', 0x3, total_frames, total_bytes)
+        frame = template[:xing_offset] + body
+        return frame + bytes(len(template) - len(frame))
+    
+    def _count_frames(self, audio_path: Path, span: Tuple[int, int, bytes]) -> Optional[int]:
+        """
+        Number of audio frames in a chapter: from its Xing/Info frame when it has
+        a frame count, else by walking the frame headers
+        Số frame audio của một chương: lấy từ frame Xing/Info nếu có, không thì
+        duyệt các header frame
+        
+        Returns:
+            Frame count, None if the stream cannot be walked
+        """
+        start, end, info_frame = span
+        layout = self._frame_layout(info_frame)
+        if layout is not None:
+            xing_offset = layout[1]
+            flags_at = xing_offset + 4
+            if info_frame[xing_offset:flags_at] in (b'Xing', b'Info') and len(info_frame) >= flags_at + 8:
+                flags, frames = struct.unpack_from('>II', info_frame, flags_at)
+                if flags & 0x1:
+                    return frames
+        
+        frames = 0
+        with open(audio_path, 'rb') as f:
+            position = start
+            while position < end:
+                f.seek(position)
+                layout = self._frame_layout(f.read(4))
+                if layout is None:
+                    return None
+                position += layout[0]
+                frames += 1
+        return frames
+    
+    @staticmethod
+    def _copy_range(src, dst, start: int, end: int):
+        """Copy bytes [start, end) of src into dst / Chép byte [start, end) sang dst"""
+        if USE_SENDFILE:
+            # Kernel-side copy, no round trip through Python buffers
+            # Chép trong kernel, không qua bộ đệm của Python
+            dst.flush()
+            try:
+                while start < end:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), start, end - start)
+                    if sent == 0:
+                        break
+                    start += sent
+                dst.seek(0, os.SEEK_END)
+                return
+            except OSError:
+                # Finish with the buffered loop / Chép nốt bằng vòng lặp thường
+                dst.seek(0, os.SEEK_END)
+        
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                break
+            dst.write(chunk)
+            remaining -= len(chunk)
+    
     def add_chapter_markers(self, audio_path: str, chapter_info: List[Dict]):
         """
         Add ID3v2 chapter markers (CHAP + CTOC) to MP3 file
@@ -153,47 +590,63 @@ class AudiobookMerger:
                 audio = MP3(audio_path)
                 audio.add_tags()
             
-            # Create CHAP frames for each chapter / Tạo CHAP frames cho từng chương
-            chapter_element_ids = []
+            frames = self._build_chapter_frames(chapter_info)
             
-            for idx, chapter in enumerate(chapter_info, 1):
-                element_id = f"chap{idx:03d}".encode('utf-8')
-                chapter_element_ids.append(element_id)
-                
-                # Create CHAP frame
-                chap = CHAP(
-                    encoding=3,  # UTF-8
-                    element_id=element_id,
-                    start_time=chapter['start_ms'],
-                    end_time=chapter['end_ms'],
-                    start_offset=0xFFFFFFFF,  # Not used
-                    end_offset=0xFFFFFFFF,    # Not used
-                    sub_frames=[
-                        TIT2(encoding=3, text=[chapter['title']])
-                    ]
-                )
-                
-                audio.tags.add(chap)
+            add_frame = audio.tags.add
+            for frame in frames:
+                add_frame(frame)
+            
+            # Save tags, keeping slack so later edits don't shift the audio
+            # Lưu tags, chừa padding để lần sửa sau không phải dịch audio
+            audio.save(padding=lambda info: max(info.padding, TAG_PADDING))
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Lỗi khi thêm chapter markers: {e}")
+            raise
+    
+    @staticmethod
+    def _build_chapter_frames(chapter_info: List[Dict]) -> List:
+        """
+        Build ID3v2 CHAP frames plus the CTOC table of contents
+        Tạo các frame CHAP và bảng mục lục CTOC
+        
+        Args:
+            chapter_info: List of chapter dicts with start_ms, end_ms, title
             
-            # Create CTOC frame (Table of Contents) / Tạo CTOC frame
-            ctoc = CTOC(
+        Returns:
+            List of ID3 frames
+        """
+        # Create CHAP frames for each chapter / Tạo CHAP frames cho từng chương
+        # ID3 element IDs are Latin-1 text; mutagen expects str, not bytes
+        chapter_element_ids = [f"chap{idx:03d}" for idx in range(1, len(chapter_info) + 1)]
+        
+        frames = [
+            CHAP(
                 encoding=3,  # UTF-8
-                element_id=b'toc',
-                flags=CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED,
-                child_element_ids=chapter_element_ids,
+                element_id=element_id,
+                start_time=chapter['start_ms'],
+                end_time=chapter['end_ms'],
+                start_offset=0xFFFFFFFF,  # Not used
+                end_offset=0xFFFFFFFF,    # Not used
                 sub_frames=[
-                    TIT2(encoding=3, text=['Audiobook Chapters'])
+                    TIT2(encoding=3, text=[chapter['title']])
                 ]
             )
-            
-            audio.tags.add(ctoc)
-            
-            # Save tags / Lưu tags
-            audio.save()
-            
-        except Exception as e:
-            print(f"⚠️ Lỗi khi thêm chapter markers: {e}")
-            raise
+            for element_id, chapter in zip(chapter_element_ids, chapter_info)
+        ]
+        
+        # Create CTOC frame (Table of Contents) / Tạo CTOC frame
+        frames.append(CTOC(
+            encoding=3,  # UTF-8
+            element_id='toc',
+            flags=CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED,
+            child_element_ids=chapter_element_ids,
+            sub_frames=[
+                TIT2(encoding=3, text=['Audiobook Chapters'])
+            ]
+        ))
+        
+        return frames
     
     def get_audio_duration(self, audio_path: str) -> float:
         """
@@ -210,7 +663,7 @@ class AudiobookMerger:
             audio = MP3(audio_path)
             return audio.info.length
         except Exception as e:
-            print(f"⚠️ Không thể lấy duration: {e}")
+            logger.warning(f"⚠️ Không thể lấy duration: {e}")
             # Fallback to file size estimate
             file_size = Path(audio_path).stat().st_size
             return file_size / 24000
@@ -218,6 +671,8 @@ class AudiobookMerger:
 
 # Test the module / Kiểm tra module
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     def progress(msg):
         print(msg)
     
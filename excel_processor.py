@@ -5,9 +5,30 @@ Excel and Text File Processor for Vietnamese TTS
 Xử lý file Excel và Text cho TTS tiếng Việt
 """
 
+import logging
+
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv  # Optional multithreaded CSV reader / Bộ đọc CSV đa luồng (tùy chọn)
+except ImportError:
+    pa = pa_csv = None
+
+logger = logging.getLogger(__name__)
+
+# Flatten line breaks of a preview in one pass / Làm phẳng xuống dòng trong một lượt
+_PREVIEW_TABLE = str.maketrans({'\n': ' ', '\r': None})
+
+# Cells read as missing, same as pandas' default na_values
+# Ô được coi là trống, giống na_values mặc định của pandas
+_CSV_NULL_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+    'n/a', 'nan', 'null',
+]
 
 
 class ExcelProcessor:
@@ -26,53 +47,113 @@ class ExcelProcessor:
         'AI Result (Vietnamese)': 'AI Result (Vietnamese)'
     }
     
+    REQUIRED_COLS_SET = frozenset(REQUIRED_COLUMNS.values())
+    
+    # Columns used for TTS, stripped once on load / Các cột dùng cho TTS, strip một lần khi tải
+    TEXT_COLUMNS = ['ID', 'Title', 'Part', 'AI Result (Vietnamese)']
+    
+    # Length of the one-line row preview / Độ dài đoạn xem trước của mỗi dòng
+    ROW_PREVIEW_LENGTH = 90
+    
+    # Rough speaking speed for duration estimates / Tốc độ đọc ước lượng (ký tự/giây)
+    CHARS_PER_SECOND = 15
+    
     def __init__(self):
         """Initialize the processor"""
         self.data = None
         self.file_path = None
     
-    def load_excel(self, file_path: str) -> bool:
+    def load_excel(self, file_path: str, columns: Optional[Iterable[str]] = None) -> bool:
         """
         Load and validate Excel or CSV file
         Tải và kiểm tra file Excel hoặc CSV
         
         Args:
             file_path: Path to Excel (.xlsx) or CSV (.csv) file
+            columns: Columns to read and require, other columns are skipped while
+                parsing (default: all REQUIRED_COLUMNS; TEXT_COLUMNS are always read)
             
         Returns:
             True if successful, False otherwise
         """
+        if columns is None:
+            wanted = list(self.REQUIRED_COLUMNS.values())
+            wanted_set = self.REQUIRED_COLS_SET
+        else:
+            wanted = list(dict.fromkeys(self.TEXT_COLUMNS + list(columns)))
+            wanted_set = frozenset(wanted)
+        
         try:
             self.file_path = Path(file_path)
             file_ext = self.file_path.suffix.lower()
             
             # Read file based on extension / Đọc file dựa trên đuôi file
             if file_ext == '.csv':
-                # Read CSV file / Đọc file CSV
-                self.data = pd.read_csv(file_path, encoding='utf-8')
-                print(f"[OK] Da tai file CSV: {self.file_path.name}")
+                # Read CSV file (multithreaded pyarrow reader when available)
+                # Đọc file CSV (dùng pyarrow đa luồng nếu có)
+                # pyarrow only takes a list of existing columns, so read the header first
+                # pyarrow chỉ nhận danh sách cột có thật nên đọc dòng tiêu đề trước
+                header = pd.read_csv(file_path, encoding='utf-8', nrows=0).columns
+                usecols = [col for col in header if col in wanted_set]
+                if pa_csv is not None:
+                    self.data = self._read_csv_arrow(file_path, usecols)
+                else:
+                    self.data = pd.read_csv(file_path, encoding='utf-8', dtype=str, usecols=usecols)
+                logger.info(f"[OK] Da tai file CSV: {self.file_path.name}")
             elif file_ext in ['.xlsx', '.xls']:
-                # Read Excel file / Đọc file Excel
-                self.data = pd.read_excel(file_path, engine='openpyxl')
-                print(f"[OK] Da tai file Excel: {self.file_path.name}")
+                # Read Excel file (Rust calamine reader, openpyxl fallback)
+                # Đọc file Excel (calamine, dự phòng openpyxl)
+                try:
+                    self.data = pd.read_excel(file_path, engine='calamine', dtype=str, usecols=wanted_set.__contains__)
+                except ImportError:
+                    self.data = pd.read_excel(file_path, engine='openpyxl', dtype=str, usecols=wanted_set.__contains__)
+                logger.info(f"[OK] Da tai file Excel: {self.file_path.name}")
             else:
-                print(f"[ERROR] Dinh dang file khong ho tro: {file_ext}")
-                print(f"        Chi ho tro: .xlsx, .xls, .csv")
+                logger.error(f"[ERROR] Dinh dang file khong ho tro: {file_ext} (chi ho tro: .xlsx, .xls, .csv)")
                 return False
             
             # Validate columns / Kiểm tra các cột
-            if not self._validate_columns():
+            if not self._validate_columns(wanted):
                 return False
             
-            # Remove empty rows / Xóa các dòng trống
-            self.data = self.data.dropna(subset=['AI Result (Vietnamese)'])
+            # Remove empty rows (NaN has no length) / Xóa các dòng trống
+            self.data = self.data[self.data['AI Result (Vietnamese)'].str.len() > 0]
+            self._normalize_columns()
             
             return True
             
         except Exception as e:
-            print(f"[ERROR] Loi khi doc file: {e}")
+            logger.error(f"[ERROR] Loi khi doc file: {e}")
             return False
     
+    @staticmethod
+    def _read_csv_arrow(file_path: str, usecols: List[str]) -> pd.DataFrame:
+        """
+        Read CSV columns as raw text with pyarrow; missing cells stay NaN
+        Đọc các cột CSV dạng chuỗi gốc bằng pyarrow; ô trống vẫn là NaN
+        
+        pandas' engine='pyarrow' infers types first and casts afterwards
+        ('001' -> '1', 1 -> '1.0', empty -> 'None'), so column types are
+        fixed to string in pyarrow itself.
+        
+        Args:
+            file_path: Path to CSV file
+            usecols: Columns to read
+            
+        Returns:
+            DataFrame of str / NaN cells
+        """
+        table = pa_csv.read_csv(
+            file_path,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=usecols,
+                column_types={column: pa.string() for column in usecols},
+                null_values=_CSV_NULL_VALUES,
+                strings_can_be_null=True
+            )
+        )
+        return table.to_pandas()
+    
     def load_text_file(self, file_path: str) -> bool:
         """
         Load text file as simple input
@@ -99,28 +180,33 @@ class ExcelProcessor:
                 'QuickTrans (Draft)': [''],
                 'AI Result (Vietnamese)': [content]
             })
+            self._normalize_columns()
             
             return True
             
         except Exception as e:
-            print(f"[ERROR] Loi khi doc file text: {e}")
+            logger.error(f"[ERROR] Loi khi doc file text: {e}")
             return False
     
-    def _validate_columns(self) -> bool:
+    def _validate_columns(self, required: Optional[List[str]] = None) -> bool:
         """
         Validate required columns exist
         Kiểm tra các cột bắt buộc
         
+        Args:
+            required: Columns to check (default: all REQUIRED_COLUMNS)
+            
         Returns:
             True if all required columns exist
         """
-        missing_cols = []
-        for col in self.REQUIRED_COLUMNS.values():
-            if col not in self.data.columns:
-                missing_cols.append(col)
+        if required is None:
+            required = list(self.REQUIRED_COLUMNS.values())
         
-        if missing_cols:
-            print(f"[ERROR] Thieu cac cot: {', '.join(missing_cols)}")
+        missing = set(required).difference(self.data.columns)
+        if missing:
+            # Keep the requested column order in the message / Giữ thứ tự cột khi báo lỗi
+            missing_cols = [col for col in required if col in missing]
+            logger.error(f"[ERROR] Thieu cac cot: {', '.join(missing_cols)}")
             return False
         
         return True
@@ -136,17 +222,39 @@ class ExcelProcessor:
         if self.data is None:
             return []
         
-        rows = []
-        for idx, row in self.data.iterrows():
-            rows.append({
-                'id': str(row['ID']).strip(),
-                'title': str(row['Title']).strip(),
-                'part': str(row['Part']).strip(),
-                'text': str(row['AI Result (Vietnamese)']).strip(),
-                'row_index': idx
-            })
+        # Columns are already stripped strings / Các cột đã được strip khi tải
+        ids = self.data['ID'].tolist()
+        titles = self.data['Title'].tolist()
+        parts = self.data['Part'].tolist()
+        text = self.data['AI Result (Vietnamese)']
+        texts = text.tolist()
+        
+        # One-line previews built in one vectorized pass / Tạo đoạn xem trước một lần cho cả cột
+        limit = self.ROW_PREVIEW_LENGTH
+        previews = (
+            text.str.slice(0, limit).str.translate(_PREVIEW_TABLE)
+            + text.str.len().gt(limit).map({True: '...', False: ''})
+        ).tolist()
         
-        return rows
+        # Estimated audio length (seconds), used to schedule long rows first
+        # Thời lượng audio ước tính (giây), dùng để xếp phần dài chạy trước
+        est_durations = (text.str.len() / self.CHARS_PER_SECOND).tolist()
+        
+        return [
+            {'id': i, 'title': t, 'part': p, 'text': x, 'preview': v,
+             'est_duration': d, 'row_index': idx}
+            for idx, i, t, p, x, v, d in zip(
+                self.data.index.tolist(), ids, titles, parts, texts, previews, est_durations
+            )
+        ]
+    
+    def _normalize_columns(self):
+        """
+        Convert TTS columns to stripped strings once (empty cells become '')
+        Chuyển các cột TTS thành chuỗi đã strip một lần (ô trống thành '')
+        """
+        for column in self.TEXT_COLUMNS:
+            self.data[column] = self.data[column].fillna('').astype(str).str.strip()
     
     def get_preview_data(self, max_rows: int = 10) -> pd.DataFrame:
         """
@@ -170,8 +278,9 @@ class ExcelProcessor:
         
         # Truncate long text for preview / Cắt ngắn text để xem trước
         if 'AI Result (Vietnamese)' in preview_df.columns:
-            preview_df['AI Result (Vietnamese)'] = preview_df['AI Result (Vietnamese)'].apply(
-                lambda x: str(x)[:100] + '...' if len(str(x)) > 100 else str(x)
+            text = preview_df['AI Result (Vietnamese)'].fillna('').astype(str)
+            preview_df['AI Result (Vietnamese)'] = text.str.slice(0, 100) + text.str.len().gt(100).map(
+                {True: '...', False: ''}
             )
         
         return preview_df
@@ -189,6 +298,8 @@ class ExcelProcessor:
 
 # Test the module / Kiểm tra module
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     processor = ExcelProcessor()
     
     # Test with sample data
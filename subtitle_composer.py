@@ -5,10 +5,34 @@ Subtitle Composer for Merged Audio Files
 Công cụ ghép phụ đề cho các file audio đã gộp
 """
 
+import logging
+import os
+from itertools import accumulate
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 import re
 
+try:
+    import numpy as np  # Optional vectorized timestamp shifting / Dời timestamp dạng vector (tùy chọn)
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+# Precompiled SRT patterns (SRT is handled as UTF-8 bytes)
+# Mẫu regex SRT biên dịch sẵn (SRT được xử lý dạng bytes UTF-8)
+_BLOCK_SPLIT_RE = re.compile(rb'\n\s*\n')
+_TS_RE = re.compile(rb'(\d+):(\d+):(\d+)[,\.](\d+)')
+
+# I/O buffers for chapter and master SRT files / Bộ đệm đọc/ghi file phụ đề
+READ_BUFFER_SIZE = 4 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Shift a chapter's timestamps as one numpy array from this many cues on
+# Từ số cue này trở lên thì dời timestamp của chương bằng mảng numpy
+VECTORIZE_MIN_CUES = 256
+
 
 class SubtitleComposer:
     """
@@ -18,7 +42,12 @@ class SubtitleComposer:
     
     def __init__(self):
         """Initialize subtitle composer"""
-        self.chapters = []  # List of chapter data with timing info
+        # Parallel per-chapter lists, timing in integer milliseconds
+        # Các list song song theo chương, thời gian tính bằng mili giây (số nguyên)
+        self._paths: List[str] = []
+        self._chapter_ids: List[str] = []
+        self._durations_ms: List[int] = []
+        self._offsets_ms: List[int] = []
         
     def add_chapter(
         self,
@@ -35,23 +64,33 @@ class SubtitleComposer:
             chapter_id: Unique identifier for the chapter
             duration_seconds: Duration of the chapter's audio
         """
-        self.chapters.append({
-            'subtitle_path': subtitle_path,
-            'chapter_id': chapter_id,
-            'duration': duration_seconds,
-            'offset': 0.0  # Will be calculated
-        })
+        self._paths.append(subtitle_path)
+        self._chapter_ids.append(chapter_id)
+        self._durations_ms.append(int(round(duration_seconds * 1000)))
     
-    def calculate_offsets(self):
+    def add_chapters_batch(self, chapters: Iterable[Tuple[str, str, float]]):
         """
-        Calculate time offsets for each chapter
-        Tính toán offset thời gian cho từng chương
+        Add many chapters at once, in the given order
+        Thêm nhiều chương một lần, theo đúng thứ tự truyền vào
+        
+        Args:
+            chapters: (subtitle_path, chapter_id, duration_seconds) tuples
+        """
+        for subtitle_path, chapter_id, duration_seconds in chapters:
+            self._paths.append(subtitle_path)
+            self._chapter_ids.append(chapter_id)
+            self._durations_ms.append(int(round(duration_seconds * 1000)))
+    
+    def calculate_offsets(self) -> List[int]:
         """
-        cumulative_time = 0.0
+        Calculate time offsets (ms) for each chapter
+        Tính toán offset thời gian (ms) cho từng chương
         
-        for chapter in self.chapters:
-            chapter['offset'] = cumulative_time
-            cumulative_time += chapter['duration']
+        Returns:
+            Start offset of every chapter in milliseconds
+        """
+        self._offsets_ms = list(accumulate([0] + self._durations_ms[:-1]))
+        return self._offsets_ms
     
     def compose_master_subtitle(self, output_path: str) -> bool:
         """
@@ -66,110 +105,113 @@ class SubtitleComposer:
         """
         try:
             # Calculate offsets / Tính offset
-            self.calculate_offsets()
+            offsets_ms = self.calculate_offsets()
             
-            # Prepare output / Chuẩn bị output
-            master_content = []
-            subtitle_index = 1
-            
-            # Process each chapter / Xử lý từng chương
-            for chapter in self.chapters:
-                subtitle_path = chapter['subtitle_path']
-                offset_ms = int(chapter['offset'] * 1000)  # Convert to milliseconds
-                
-                if not Path(subtitle_path).exists():
-                    print(f"⚠️ Không tìm thấy file phụ đề: {subtitle_path}")
+            # Skip missing chapter files / Bỏ qua chương thiếu file phụ đề
+            existing = self._existing_files(self._paths)
+            chapters = []
+            missing = []
+            for subtitle_path, offset_ms in zip(self._paths, offsets_ms):
+                if os.path.normcase(subtitle_path) not in existing:
+                    missing.append(subtitle_path)
                     continue
-                
-                # Read chapter subtitle / Đọc phụ đề chương
-                with open(subtitle_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Parse and adjust timestamps / Parse và điều chỉnh timestamp
-                adjusted_blocks = self._adjust_subtitle_timing(
-                    content, offset_ms, subtitle_index
-                )
-                
-                master_content.extend(adjusted_blocks)
-                subtitle_index += len(adjusted_blocks)
+                chapters.append((subtitle_path, offset_ms))
+            
+            # One warning for all missing files / Một cảnh báo cho mọi file thiếu
+            if missing:
+                shown = ', '.join(Path(path).name for path in missing[:5])
+                more = f" (+{len(missing) - 5})" if len(missing) > 5 else ""
+                logger.warning(f"⚠️ Không tìm thấy {len(missing)} file phụ đề: {shown}{more}")
             
             # Write master file / Ghi file tổng
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            subtitle_index = 1
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n\n'.join(master_content))
+            # Timestamps and markers are ASCII, so the UTF-8 text is never decoded
+            # Timestamp và ký hiệu đều là ASCII nên không cần giải mã text UTF-8
+            with open(output_path, 'wb', buffering=WRITE_BUFFER_SIZE) as out:
+                # Chapters are shifted independently and numbered here in order
+                # Các chương được dời thời gian độc lập, đánh số theo thứ tự tại đây
+                for cues in self._shift_chapters(chapters):
+                    for block in number_cues(cues, subtitle_index):
+                        if subtitle_index > 1:
+                            out.write(b'\n\n')
+                        out.write(block)
+                        subtitle_index += 1
             
-            print(f"✅ Đã tạo file phụ đề tổng: {output_path}")
-            print(f"   📊 Tổng số chương: {len(self.chapters)}")
-            print(f"   📊 Tổng số subtitle: {subtitle_index - 1}")
+            logger.info(
+                f"✅ Đã tạo file phụ đề tổng: {output_path}\n"
+                f"   📊 Tổng số chương: {len(self._paths)}\n"
+                f"   📊 Tổng số subtitle: {subtitle_index - 1}"
+            )
             
             return True
             
         except Exception as e:
-            print(f"❌ Lỗi khi ghép phụ đề: {e}")
+            logger.error(f"❌ Lỗi khi ghép phụ đề: {e}")
             return False
     
+    @staticmethod
+    def _existing_files(paths: List[str]) -> set:
+        """
+        Which of the paths exist, with one directory listing per folder
+        Các đường dẫn đang tồn tại, mỗi thư mục chỉ liệt kê một lần
+        
+        Returns:
+            Set of existing paths (os.path.normcase applied)
+        """
+        existing = set()
+        for directory in {os.path.dirname(path) for path in paths}:
+            try:
+                with os.scandir(directory or '.') as entries:
+                    existing.update(
+                        os.path.normcase(os.path.join(directory, entry.name)) for entry in entries
+                    )
+            except OSError:
+                pass  # Missing folder: none of its files exist
+        return existing
+    
+    @staticmethod
+    def _shift_chapters(chapters: List[Tuple[str, int]]) -> Iterator[List[Tuple[bytes, Optional[bytes]]]]:
+        """
+        Read and shift every chapter, one at a time
+        Đọc và dời thời gian từng chương, lần lượt từng chương
+        
+        Chapter SRTs are a few KB each, so this stays in-process: a process
+        pool costs far more to start (on Windows every worker re-imports the
+        GUI's modules) than the whole book takes to shift serially.
+        
+        Args:
+            chapters: List of (subtitle_path, offset_ms) in book order
+            
+        Yields:
+            Shifted cues of each chapter, in book order
+        """
+        for subtitle_path, offset_ms in chapters:
+            yield read_and_shift(subtitle_path, offset_ms)
+    
     def _adjust_subtitle_timing(
         self,
-        srt_content: str,
+        srt_content: bytes,
         offset_ms: int,
         start_index: int
-    ) -> List[str]:
+    ) -> Iterator[bytes]:
         """
         Adjust subtitle timing with offset and reindex
         Điều chỉnh thời gian phụ đề với offset và đánh số lại
         
         Args:
-            srt_content: Original SRT content
+            srt_content: Original SRT content (UTF-8 bytes)
             offset_ms: Time offset in milliseconds
             start_index: Starting subtitle index
             
         Returns:
-            List of adjusted subtitle blocks
+            Iterator over adjusted subtitle blocks (bytes)
         """
-        # Split into blocks / Tách thành các khối
-        blocks = re.split(r'\n\s*\n', srt_content.strip())
-        adjusted_blocks = []
-        
-        current_index = start_index
-        
-        for block in blocks:
-            if not block.strip():
-                continue
-            
-            lines = block.strip().split('\n')
-            
-            if len(lines) < 2:
-                continue
-            
-            # Parse timing line (format: 00:00:00,000 --> 00:00:01,000)
-            timing_line = lines[1] if len(lines) > 1 else lines[0]
-            
-            if '-->' in timing_line:
-                # Extract timestamps / Trích xuất timestamp
-                parts = timing_line.split('-->')
-                start_time = parts[0].strip()
-                end_time = parts[1].strip()
-                
-                # Adjust timestamps / Điều chỉnh timestamp
-                new_start = self._add_offset_to_timestamp(start_time, offset_ms)
-                new_end = self._add_offset_to_timestamp(end_time, offset_ms)
-                
-                # Rebuild block with new index and timing
-                new_block = f"{current_index}\n{new_start} --> {new_end}"
-                
-                # Add subtitle text / Thêm text phụ đề
-                if len(lines) > 2:
-                    subtitle_text = '\n'.join(lines[2:])
-                    new_block += f"\n{subtitle_text}"
-                
-                adjusted_blocks.append(new_block)
-                current_index += 1
-        
-        return adjusted_blocks
+        return reindex_and_offset(srt_content, offset_ms, start_index)
     
     @staticmethod
-    def _add_offset_to_timestamp(timestamp: str, offset_ms: int) -> str:
+    def _add_offset_to_timestamp(timestamp: bytes, offset_ms: int) -> bytes:
         """
         Add millisecond offset to SRT timestamp
         Thêm offset (mili giây) vào timestamp SRT
@@ -181,49 +223,218 @@ class SubtitleComposer:
         Returns:
             Adjusted timestamp
         """
-        # Parse timestamp / Parse timestamp
-        # Format: HH:MM:SS,mmm
-        match = re.match(r'(\d+):(\d+):(\d+)[,\.](\d+)', timestamp)
+        # Parse timestamp and add offset / Parse timestamp và cộng offset
+        # Format: HH:MM:SS,mmm (fixed width, slice directly / độ dài cố định, cắt trực tiếp)
+        if (len(timestamp) == 12 and timestamp[2:3] == b':' and timestamp[5:6] == b':'
+                and timestamp[8:9] in b',.' and timestamp.isascii()):
+            try:
+                total_ms = (
+                    int(timestamp[0:2]) * 3600000 +
+                    int(timestamp[3:5]) * 60000 +
+                    int(timestamp[6:8]) * 1000 +
+                    int(timestamp[9:12]) +
+                    offset_ms
+                )
+            except ValueError:
+                return timestamp
+        else:
+            # Irregular widths go through the regex / Độ dài khác thì dùng regex
+            match = _TS_RE.match(timestamp)
+            
+            if not match:
+                return timestamp
+            
+            hours, minutes, seconds, milliseconds = match.groups()
+            total_ms = (
+                int(hours) * 3600000 +
+                int(minutes) * 60000 +
+                int(seconds) * 1000 +
+                int(milliseconds) +
+                offset_ms
+            )
         
-        if not match:
-            return timestamp
+        # Convert back / Chuyển ngược lại
+        hours, total_ms = divmod(total_ms, 3600000)
+        minutes, total_ms = divmod(total_ms, 60000)
+        seconds, milliseconds = divmod(total_ms, 1000)
         
-        hours = int(match.group(1))
-        minutes = int(match.group(2))
-        seconds = int(match.group(3))
-        milliseconds = int(match.group(4))
+        # Format / Định dạng
+        return b"%02d:%02d:%02d,%03d" % (hours, minutes, seconds, milliseconds)
+    
+    def clear(self):
+        """Clear all chapters / Xóa tất cả các chương"""
+        self._paths = []
+        self._chapter_ids = []
+        self._durations_ms = []
+        self._offsets_ms = []
+
+
+def shift_cues(srt_content: bytes, offset_ms: int) -> Iterator[Tuple[bytes, Optional[bytes]]]:
+    """
+    Parse one SRT file and shift every cue, without numbering
+    Parse một file SRT và dời thời gian mọi cue, chưa đánh số
+    
+    Args:
+        srt_content: Original SRT content (UTF-8 bytes)
+        offset_ms: Time offset in milliseconds
         
-        # Convert to total milliseconds / Chuyển sang tổng mili giây
-        total_ms = (
-            hours * 3600000 +
-            minutes * 60000 +
-            seconds * 1000 +
-            milliseconds
+    Yields:
+        (timing_line, subtitle_text or None) per cue
+    """
+    # Split into blocks / Tách thành các khối
+    content = srt_content.strip()
+    if b'\r' in content:
+        content = content.replace(b'\r\n', b'\n')
+    blocks = content.split(b'\n\n')
+    
+    # Blank lines with spaces or extra newlines: one cue per block no longer
+    # holds, so use the tolerant regex split
+    # Dòng trống có khoảng trắng hoặc thừa dòng: dùng regex để tách
+    if content.count(b'-->') != len(blocks):
+        blocks = _BLOCK_SPLIT_RE.split(content)
+    
+    add_offset = SubtitleComposer._add_offset_to_timestamp
+    
+    if np is not None and len(blocks) >= VECTORIZE_MIN_CUES:
+        cues = list(_parse_cues(blocks))
+        stamps = _shift_timestamps_vectorized(
+            [stamp for start_time, end_time, _ in cues for stamp in (start_time, end_time)],
+            offset_ms
         )
+        if stamps is not None:
+            for i, (_, _, subtitle_text) in enumerate(cues):
+                yield b"%s --> %s" % (stamps[2 * i], stamps[2 * i + 1]), subtitle_text
+            return
+    else:
+        cues = _parse_cues(blocks)
+    
+    for start_time, end_time, subtitle_text in cues:
+        # Adjust timestamps / Điều chỉnh timestamp
+        new_start = add_offset(start_time, offset_ms)
+        new_end = add_offset(end_time, offset_ms)
         
-        # Add offset / Thêm offset
-        total_ms += offset_ms
-        
-        # Convert back / Chuyển ngược lại
-        new_hours = total_ms // 3600000
-        total_ms %= 3600000
+        yield b"%s --> %s" % (new_start, new_end), subtitle_text
+
+
+def _parse_cues(blocks: List[bytes]) -> Iterator[Tuple[bytes, bytes, Optional[bytes]]]:
+    """
+    Split SRT blocks into (start, end, text or None), skipping malformed blocks
+    Tách khối SRT thành (bắt đầu, kết thúc, text hoặc None), bỏ khối lỗi
+    """
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
         
-        new_minutes = total_ms // 60000
-        total_ms %= 60000
+        # Index, timing line and the text kept as one piece (no split/re-join)
+        # Số thứ tự, dòng thời gian và phần text giữ nguyên một khối
+        _, _, rest = block.partition(b'\n')
+        if not rest:
+            continue
         
-        new_seconds = total_ms // 1000
-        new_milliseconds = total_ms % 1000
+        # Parse timing line (format: 00:00:00,000 --> 00:00:01,000)
+        timing_line, has_text, subtitle_text = rest.partition(b'\n')
+        start_time, arrow, end_time = timing_line.partition(b'-->')
+        if not arrow:
+            continue
         
-        # Format / Định dạng
-        return f"{new_hours:02d}:{new_minutes:02d}:{new_seconds:02d},{new_milliseconds:03d}"
+        yield start_time.strip(), end_time.strip(), (subtitle_text if has_text else None)
+
+
+def _shift_timestamps_vectorized(stamps: List[bytes], offset_ms: int) -> Optional[List[bytes]]:
+    """
+    Shift many HH:MM:SS,mmm timestamps at once with numpy integer arithmetic
+    Dời nhiều timestamp HH:MM:SS,mmm cùng lúc bằng số học số nguyên numpy
     
-    def clear(self):
-        """Clear all chapters / Xóa tất cả các chương"""
-        self.chapters = []
+    Returns:
+        Shifted timestamps, or None when any stamp is not fixed width (or the
+        result would need 3-digit hours) so the caller uses the scalar path
+    """
+    if set(map(len, stamps)) != {12}:
+        return None
+    
+    # Non-ASCII bytes fail the separator/digit checks below
+    buf = np.frombuffer(b''.join(stamps), dtype=np.uint8).reshape(-1, 12)
+    if not ((buf[:, [2, 5]] == ord(':')).all() and np.isin(buf[:, 8], (ord(','), ord('.'))).all()):
+        return None
+    
+    digits = buf[:, [0, 1, 3, 4, 6, 7, 9, 10, 11]].astype(np.int64) - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        return None
+    
+    total_ms = (
+        (digits[:, 0] * 10 + digits[:, 1]) * 3600000 +
+        (digits[:, 2] * 10 + digits[:, 3]) * 60000 +
+        (digits[:, 4] * 10 + digits[:, 5]) * 1000 +
+        digits[:, 6] * 100 + digits[:, 7] * 10 + digits[:, 8] +
+        offset_ms
+    )
+    if total_ms.min() < 0 or total_ms.max() >= 100 * 3600000:
+        return None
+    
+    hours, total_ms = np.divmod(total_ms, 3600000)
+    minutes, total_ms = np.divmod(total_ms, 60000)
+    seconds, milliseconds = np.divmod(total_ms, 1000)
+    
+    out = np.empty_like(buf)
+    out[:, 0], out[:, 1] = np.divmod(hours, 10)
+    out[:, 3], out[:, 4] = np.divmod(minutes, 10)
+    out[:, 6], out[:, 7] = np.divmod(seconds, 10)
+    out[:, 9], out[:, 10] = np.divmod(milliseconds // 10, 10)
+    out[:, 11] = milliseconds % 10
+    out += ord('0')
+    out[:, [2, 5]] = ord(':')
+    out[:, 8] = ord(',')
+    
+    raw = out.tobytes()
+    return [raw[i:i + 12] for i in range(0, len(raw), 12)]
+
+
+def number_cues(cues: Iterable[Tuple[bytes, Optional[bytes]]], start_index: int) -> Iterator[bytes]:
+    """
+    Turn shifted cues into SRT blocks numbered from start_index
+    Chuyển các cue đã dời thời gian thành khối SRT, đánh số từ start_index
+    """
+    for current_index, (timing_line, subtitle_text) in enumerate(cues, start_index):
+        if subtitle_text is None:
+            yield b"%d\n%s" % (current_index, timing_line)
+        else:
+            yield b"%d\n%s\n%s" % (current_index, timing_line, subtitle_text)
+
+
+def reindex_and_offset(srt_content: bytes, offset_ms: int, start_index: int) -> Iterator[bytes]:
+    """
+    Shift every cue of one SRT file and renumber it from start_index
+    Dời thời gian mọi cue của một file SRT và đánh số lại từ start_index
+    
+    Self-contained (no composer state) so it can be swapped for a compiled
+    implementation with the same signature.
+    
+    Args:
+        srt_content: Original SRT content (UTF-8 bytes)
+        offset_ms: Time offset in milliseconds
+        start_index: Starting subtitle index
+        
+    Returns:
+        Iterator over adjusted subtitle blocks (bytes)
+    """
+    return number_cues(shift_cues(srt_content, offset_ms), start_index)
+
+
+def read_and_shift(subtitle_path: str, offset_ms: int) -> List[Tuple[bytes, Optional[bytes]]]:
+    """
+    Read one chapter SRT and shift its cues
+    Đọc file SRT của một chương và dời thời gian
+    """
+    with open(subtitle_path, 'rb', buffering=READ_BUFFER_SIZE) as f:
+        content = f.read()
+    return list(shift_cues(content, offset_ms))
 
 
 # Test the module / Kiểm tra module
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Create test subtitle files
     test_srt_1 = """1
 00:00:00,000 --> 00:00:02,500
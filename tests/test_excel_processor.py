@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for CSV loading in ExcelProcessor
+Kiểm thử việc đọc file CSV của ExcelProcessor
+"""
+
+import pytest
+
+import excel_processor
+from excel_processor import ExcelProcessor
+
+CSV_HEADER = "ID,Title,Part,Source Text (Chinese),QuickTrans (Draft),AI Result (Vietnamese)\n"
+
+
+@pytest.fixture(params=["pyarrow", "c"])
+def reader(request, monkeypatch):
+    """Run each test with the pyarrow reader and with the pandas C fallback"""
+    if request.param == "pyarrow":
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(excel_processor, "pa_csv", None)
+    return request.param
+
+
+def _load_rows(tmp_path, body: str):
+    csv_path = tmp_path / "book.csv"
+    csv_path.write_text(CSV_HEADER + body, encoding="utf-8")
+    processor = ExcelProcessor()
+    assert processor.load_excel(str(csv_path))
+    return processor.get_rows_for_processing()
+
+
+def test_empty_text_row_is_dropped(tmp_path, reader):
+    rows = _load_rows(tmp_path, "1,Chương,1,x,y,Xin chào\n2,Chương,2,x,y,\n")
+    assert [row['id'] for row in rows] == ['1']
+    assert all(row['text'] != 'None' for row in rows)
+
+
+def test_numeric_cells_keep_their_text(tmp_path, reader):
+    rows = _load_rows(tmp_path, "001,Chương,1,x,y,Một\n002,Chương,,x,y,  Hai  \n")
+    assert [(row['id'], row['part'], row['text']) for row in rows] == [
+        ('001', '1', 'Một'),
+        ('002', '', 'Hai'),
+    ]
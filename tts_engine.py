@@ -7,9 +7,185 @@ Công cụ chuyển văn bản tiếng Việt thành giọng nói
 
 import edge_tts
 import asyncio
-from pathlib import Path
-from typing import Optional, Dict, Callable
+import logging
+import os
 import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import CancelledError
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Callable, List
+
+try:
+    from mutagen.mp3 import MP3  # Header-only duration / Đọc thời lượng từ header
+except ImportError:
+    MP3 = None
+
+logger = logging.getLogger(__name__)
+
+
+# Punctuation kept by clean_text_for_tts / Dấu câu được giữ lại khi làm sạch văn bản
+_TTS_PUNCTUATION = frozenset('.,;:!?-–—"\'()')
+
+
+class _TTSCharFilter(dict):
+    """
+    str.translate table that drops characters TTS should not see, filled lazily
+    Bảng str.translate loại bỏ ký tự không dùng cho TTS, tạo dần khi gặp
+    
+    Keeps word characters (letters incl. Vietnamese, digits, '_'), whitespace
+    and _TTS_PUNCTUATION, the same set as the old regex character class.
+    """
+    
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        if char.isalnum() or char == '_' or char.isspace() or char in _TTS_PUNCTUATION:
+            result = codepoint
+        else:
+            result = None
+        self[codepoint] = result
+        return result
+
+
+_TTS_CHAR_FILTER = _TTSCharFilter()
+
+# Anything clean_text_for_tts would change: a dropped character, non-space
+# whitespace, a double space or a leading/trailing space
+# Bất kỳ thứ gì clean_text_for_tts sẽ thay đổi
+_NEEDS_CLEANING_RE = re.compile(r'[^\w .,;:!?\-–—"\'()]|  |^ | $')
+
+
+@lru_cache(maxsize=1024)
+def _read_duration(audio_path: str, mtime_ns: int, size: int) -> float:
+    """
+    Duration of an audio file, cached per (path, mtime, size)
+    Thời lượng file audio, lưu cache theo (đường dẫn, mtime, dung lượng)
+    """
+    if MP3 is not None:
+        try:
+            return MP3(audio_path).info.length
+        except Exception:
+            pass
+    
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        try:
+            result = subprocess.run(
+                [ffprobe, '-v', 'error', '-show_entries', 'format=duration',
+                 '-of', 'default=noprint_wrappers=1:nokey=1', audio_path],
+                capture_output=True, text=True, check=True
+            )
+            return float(result.stdout.strip())
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            pass
+    
+    # Rough estimate: 1 second ≈ 16-32 KB at 128kbps
+    return size / 24000
+
+
+class CircuitBreaker:
+    """
+    Shared fail-fast guard for calls to the TTS service
+    Cầu dao dùng chung: ngừng gọi dịch vụ TTS khi lỗi liên tiếp
+    
+    Opens after `threshold` consecutive failures. While open, allow_request()
+    refuses calls until `reset_timeout` seconds have passed; then a single
+    trial call is let through (half-open) and its outcome closes or re-opens
+    the breaker. Safe to share between worker threads.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, threshold: int = 5, reset_timeout: float = 60.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.last_failure_time = 0.0
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """
+        Whether a call may be made now / Có được phép gọi lúc này không
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.last_failure_time >= self.reset_timeout:
+                # This caller becomes the single trial request
+                self.state = self.HALF_OPEN
+                return True
+            return False
+    
+    def record_success(self):
+        """Call succeeded / Gọi thành công"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failure_count = 0
+    
+    def record_failure(self):
+        """Call failed / Gọi thất bại"""
+        with self._lock:
+            self.failure_count += 1
+            self.last_failure_time = time.monotonic()
+            if self.state == self.HALF_OPEN or self.failure_count >= self.threshold:
+                self.state = self.OPEN
+
+
+class TokenBucket:
+    """
+    Shared request-rate limiter for calls to the TTS service
+    Bộ giới hạn tốc độ gọi dịch vụ TTS, dùng chung giữa các luồng
+    
+    Refills `rate` tokens per second up to `capacity`; acquire() takes one
+    token, blocking until one is available. Idle time builds up a burst of
+    at most `capacity` calls. Safe to share between worker threads.
+    """
+    
+    def __init__(self, rate: float = 2.0, capacity: int = 4):
+        self._check_rate(rate)
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+    
+    def _refill(self):
+        """Add the tokens earned since the last refill / Nạp token tích lũy từ lần trước"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+    
+    def set_rate(self, rate: float):
+        """
+        Change the refill rate (tokens per second) / Đổi tốc độ nạp token (token/giây)
+        """
+        self._check_rate(rate)
+        with self._cond:
+            self._refill()
+            self.rate = rate
+            self._cond.notify_all()
+    
+    @staticmethod
+    def _check_rate(rate: float):
+        """A zero or negative rate would never refill / Tốc độ <= 0 sẽ không bao giờ nạp lại"""
+        if not rate > 0:
+            raise ValueError(f"rate must be > 0, got {rate!r}")
+    
+    def acquire(self):
+        """Take one token, waiting if none is left / Lấy một token, chờ nếu đã hết"""
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._cond.wait((1 - self._tokens) / self.rate)
 
 
 class TTSEngine:
@@ -18,6 +194,9 @@ class TTSEngine:
     Công cụ TTS sử dụng Microsoft Edge TTS
     """
     
+    # Concurrent edge-tts connections in generate_many / Số kết nối đồng thời
+    MAX_CONCURRENT_REQUESTS = 8
+    
     # Vietnamese voices available / Giọng đọc tiếng Việt
     VIETNAMESE_VOICES = {
         'HoaiMy (Nữ)': 'vi-VN-HoaiMyNeural',
@@ -30,6 +209,15 @@ class TTSEngine:
         self.rate = '+0%'  # Speech rate (-50% to +50%)
         self.pitch = '+0Hz'  # Speech pitch (-50Hz to +50Hz)
         self.volume = '+0%'  # Volume (0% to 100%)
+        
+        # Event loop reused by the sync wrappers, started on first use
+        # Event loop dùng chung cho các hàm đồng bộ, khởi tạo khi cần
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        
+        # Output folders already created / Các thư mục output đã tạo
+        self._mkdir_cache = set()
     
     def set_voice(self, voice_name: str):
         """
@@ -80,12 +268,25 @@ class TTSEngine:
         relative_volume = volume_percent - 100
         self.volume = f"{relative_volume:+d}%"
     
+    def voice_settings(self) -> Dict[str, str]:
+        """
+        Snapshot of the current voice/rate/pitch/volume
+        Ảnh chụp giọng/tốc độ/cao độ/âm lượng hiện tại
+        """
+        return {
+            'voice': self.voice,
+            'rate': self.rate,
+            'pitch': self.pitch,
+            'volume': self.volume
+        }
+    
     async def generate_audio_with_subtitles(
         self,
         text: str,
         output_audio_path: str,
         output_subtitle_path: Optional[str] = None,
-        progress_callback: Optional[Callable[[str], None]] = None
+        progress_callback: Optional[Callable[[str], None]] = None,
+        settings: Optional[Dict[str, str]] = None
     ) -> Dict:
         """
         Generate audio file with optional subtitles
@@ -96,6 +297,8 @@ class TTSEngine:
             output_audio_path: Path for output MP3 file
             output_subtitle_path: Optional path for SRT subtitle file
             progress_callback: Optional callback for progress updates
+            settings: Optional voice/rate/pitch/volume snapshot from
+                voice_settings(); defaults to the engine's current values
             
         Returns:
             Dictionary with success status and metadata
@@ -104,21 +307,18 @@ class TTSEngine:
             if progress_callback:
                 progress_callback(f"🎤 Đang tạo audio: {Path(output_audio_path).name}")
             
+            if settings is None:
+                settings = self.voice_settings()
+            
             # Create communicate object / Tạo đối tượng communicate
-            communicate = edge_tts.Communicate(
-                text=text,
-                voice=self.voice,
-                rate=self.rate,
-                pitch=self.pitch,
-                volume=self.volume
-            )
+            communicate = edge_tts.Communicate(text=text, **settings)
             
             # Create output directory if needed / Tạo thư mục output
-            Path(output_audio_path).parent.mkdir(parents=True, exist_ok=True)
+            self._ensure_parent_dir(output_audio_path)
             
             # Generate audio and subtitles / Tạo audio và phụ đề
             if output_subtitle_path:
-                Path(output_subtitle_path).parent.mkdir(parents=True, exist_ok=True)
+                self._ensure_parent_dir(output_subtitle_path)
                 submaker = edge_tts.SubMaker()
                 
                 with open(output_audio_path, "wb") as audio_file:
@@ -145,9 +345,9 @@ class TTSEngine:
                 'success': True,
                 'audio_path': output_audio_path,
                 'subtitle_path': output_subtitle_path,
-                'voice': self.voice,
-                'rate': self.rate,
-                'pitch': self.pitch
+                'voice': settings['voice'],
+                'rate': settings['rate'],
+                'pitch': settings['pitch']
             }
             
         except Exception as e:
@@ -165,7 +365,8 @@ class TTSEngine:
         text: str,
         output_audio_path: str,
         output_subtitle_path: Optional[str] = None,
-        progress_callback: Optional[Callable[[str], None]] = None
+        progress_callback: Optional[Callable[[str], None]] = None,
+        settings: Optional[Dict[str, str]] = None
     ) -> Dict:
         """
         Synchronous wrapper for audio generation
@@ -177,12 +378,146 @@ class TTSEngine:
         Returns:
             Result dictionary
         """
-        return asyncio.run(
+        return self._run(
             self.generate_audio_with_subtitles(
-                text, output_audio_path, output_subtitle_path, progress_callback
+                text, output_audio_path, output_subtitle_path, progress_callback,
+                settings
             )
         )
     
+    def prepare_output_dirs(self, *dirs):
+        """
+        Create output folders up front so later writes skip the mkdir
+        Tạo trước các thư mục output để các lần ghi sau không cần mkdir
+        
+        Args:
+            dirs: Folders that generated files will be written into
+        """
+        for folder in dirs:
+            folder = os.path.abspath(folder)
+            os.makedirs(folder, exist_ok=True)
+            self._mkdir_cache.add(folder)
+    
+    def _ensure_parent_dir(self, file_path: str):
+        """
+        Create the parent folder of file_path once per engine
+        Tạo thư mục cha của file_path (mỗi thư mục một lần)
+        """
+        parent = os.path.dirname(os.path.abspath(file_path))
+        if parent not in self._mkdir_cache:
+            os.makedirs(parent, exist_ok=True)
+            self._mkdir_cache.add(parent)
+    
+    async def generate_many(
+        self,
+        jobs: List[Dict],
+        progress_callback: Optional[Callable[[str], None]] = None
+    ) -> List[Dict]:
+        """
+        Generate several audio files concurrently
+        Tạo nhiều file audio đồng thời
+        
+        Args:
+            jobs: List of dicts with 'text', 'output_audio_path' and
+                optional 'output_subtitle_path'
+            progress_callback: Optional callback for progress updates
+            
+        Returns:
+            Result dictionaries in the same order as jobs
+        """
+        # Bound open connections to respect edge-tts rate limits
+        # Giới hạn số kết nối để tránh bị chặn
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        
+        async def run_job(job: Dict) -> Dict:
+            async with semaphore:
+                return await self.generate_audio_with_subtitles(
+                    job['text'],
+                    job['output_audio_path'],
+                    job.get('output_subtitle_path'),
+                    progress_callback
+                )
+        
+        return await asyncio.gather(*(run_job(job) for job in jobs))
+    
+    def generate_many_sync(
+        self,
+        jobs: List[Dict],
+        progress_callback: Optional[Callable[[str], None]] = None
+    ) -> List[Dict]:
+        """
+        Synchronous wrapper for generate_many
+        Wrapper đồng bộ cho generate_many
+        
+        Args:
+            Same as generate_many
+            
+        Returns:
+            Result dictionaries in the same order as jobs
+        """
+        return self._run(self.generate_many(jobs, progress_callback))
+    
+    def _run(self, coro):
+        """
+        Run a coroutine on the engine's loop thread and wait for the result
+        Chạy coroutine trên luồng event loop của engine và chờ kết quả
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="tts-event-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+            # Submitted under the lock so close() always sees (and cancels) it
+            # Gửi trong khóa để close() luôn thấy (và hủy) được yêu cầu này
+            future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        
+        try:
+            return future.result()
+        except CancelledError:
+            raise RuntimeError("TTS engine was closed during the request") from None
+    
+    def close(self):
+        """
+        Stop the background event loop
+        Dừng event loop chạy nền
+        """
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = None
+            self._loop_thread = None
+        
+        if loop is None:
+            return
+        
+        # Cancel running requests first, so threads waiting in _run() get an
+        # error instead of waiting forever on a stopped loop
+        # Hủy các yêu cầu đang chạy trước, để luồng đang chờ trong _run() nhận lỗi
+        # thay vì chờ mãi trên một loop đã dừng
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), loop).result(timeout=5)
+        except Exception:
+            pass
+        
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        if not thread.is_alive():
+            loop.close()
+    
+    @staticmethod
+    async def _cancel_tasks():
+        """
+        Cancel every other task on the running loop and wait for them to finish
+        Hủy mọi task khác trên loop đang chạy và chờ chúng kết thúc
+        """
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
     async def get_audio_duration(self, audio_path: str) -> float:
         """
         Get duration of audio file in seconds
@@ -194,19 +529,27 @@ class TTSEngine:
         Returns:
             Duration in seconds
         """
-        try:
-            # Use a simple method - count audio chunks
-            # For more precise duration, would need additional library like mutagen
-            # For now, return estimated duration based on file size
-            
-            file_size = Path(audio_path).stat().st_size
-            # Rough estimate: 1 second ≈ 16-32 KB at 128kbps
-            estimated_duration = file_size / 24000  # Rough middle estimate
+        return self.probe_audio_duration(audio_path)
+    
+    @staticmethod
+    def probe_audio_duration(audio_path: str) -> float:
+        """
+        Get duration of audio file in seconds (synchronous, cached)
+        Lấy thời lượng file audio (giây), đồng bộ và có cache
+        
+        Args:
+            audio_path: Path to audio file
             
-            return estimated_duration
+        Returns:
+            Duration in seconds, 0.0 on error
+        """
+        try:
+            # Key on mtime/size so a regenerated file is read again
+            stat = Path(audio_path).stat()
+            return _read_duration(str(audio_path), stat.st_mtime_ns, stat.st_size)
             
         except Exception as e:
-            print(f"⚠️ Không thể lấy thời lượng audio: {e}")
+            logger.warning(f"⚠️ Không thể lấy thời lượng audio: {e}")
             return 0.0
     
     @staticmethod
@@ -221,12 +564,16 @@ class TTSEngine:
         Returns:
             Cleaned text
         """
+        # Already clean: one C-level scan, no copies / Đã sạch thì trả về ngay
+        if not _NEEDS_CLEANING_RE.search(text):
+            return text
+        
         # Remove excessive whitespace / Xóa khoảng trắng thừa
-        text = re.sub(r'\s+', ' ', text)
+        text = ' '.join(text.split())
         
         # Remove special characters that might cause issues
         # Keep Vietnamese characters, punctuation, numbers
-        text = re.sub(r'[^\w\s\.,;:!?\-–—\"\'()àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ]', '', text)
+        text = text.translate(_TTS_CHAR_FILTER)
         
         # Trim / Cắt khoảng trắng đầu cuối
         text = text.strip()
@@ -238,6 +585,8 @@ class TTSEngine:
 if __name__ == "__main__":
     import asyncio
     
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     async def test_tts():
         """Test TTS engine"""
         engine = TTSEngine()
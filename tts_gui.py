@@ -7,7 +7,19 @@ Phiên bản 2.0 — Giao diện chuyên nghiệp
 
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
+import os
+import sys
 import threading
+import logging
+import queue
+import random
+from collections import deque
+import hashlib
+import weakref
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import re
+from itertools import compress, cycle
 from pathlib import Path
 from typing import Optional
 import pandas as pd
@@ -17,11 +29,47 @@ import time
 
 # Import project modules
 from excel_processor import ExcelProcessor
-from tts_engine import TTSEngine
+from tts_engine import TTSEngine, CircuitBreaker, TokenBucket
 from subtitle_composer import SubtitleComposer
-from audio_player import AudioPlayer, PlayerState
+from audio_player import create_audio_player, PlayerState
 from audiobook_merger import AudiobookMerger
 
+# Module có nhật ký hiển thị trong ô nhật ký của ứng dụng
+MODULE_LOGGERS = (
+    "excel_processor", "audio_player", "audiobook_merger", "subtitle_composer", "tts_engine"
+)
+
+# Tên các giọng đọc cho menu chọn giọng (lấy một lần khi nạp module)
+VOICE_NAMES = tuple(TTSEngine.VIETNAMESE_VOICES)
+
+# Bảng dữ liệu chỉ tạo widget cho các dòng đang hiện, tái sử dụng khi cuộn
+ROW_HEIGHT = 36         # Chiều cao mỗi dòng (px, trước khi scale DPI)
+ROW_POOL_BUFFER = 2     # Số dòng dự phòng ngoài vùng nhìn thấy
+
+# Nghe thử theo từng câu: tạo câu kế tiếp trong lúc câu hiện tại đang phát
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?…])\s+')
+PREVIEW_MIN_CHUNK_CHARS = 60  # Gộp câu ngắn để bớt số lần gọi TTS (trừ câu đầu)
+PREVIEW_QUEUE_SIZE = 2  # Số câu đã tạo sẵn chờ phát
+# File nghe thử dùng xoay vòng: câu đang phát + các câu chờ + câu đang tạo
+PREVIEW_SLOTS = PREVIEW_QUEUE_SIZE + 2
+
+# Số phần chuyển đổi song song (edge-tts chủ yếu chờ mạng, không tốn CPU)
+BATCH_WORKERS = 8
+BATCH_WORKER_CHOICES = ("1", "2", "4", "6", "8")
+# Giới hạn số yêu cầu TTS/giây cho mọi luồng cộng lại (tăng nếu dịch vụ cho phép),
+# cho phép dồn tối đa BATCH_REQUEST_BURST yêu cầu sau lúc rảnh
+BATCH_REQUESTS_PER_SEC = 4.0
+BATCH_REQUEST_BURST = BATCH_WORKERS
+
+# Slider chỉ áp dụng giá trị mới nhất tối đa ~60 lần/giây khi kéo
+SLIDER_THROTTLE_MS = 16
+
+# Ô nhật ký: gom dòng và ghi mỗi LOG_FLUSH_MS; vượt LOG_MAX_LINES dòng thì
+# cắt còn LOG_KEEP_LINES dòng mới nhất (mỗi ~500 dòng mới cắt một lần)
+LOG_FLUSH_MS = 50
+LOG_MAX_LINES = 2500
+LOG_KEEP_LINES = 2000
+
 
 # ═══════════════════════════════════════════════════════════════
 # THIẾT KẾ: Bảng màu & hằng số giao diện
@@ -59,6 +107,52 @@ class Theme:
     FONT_MONO = "Consolas"
 
 
+@lru_cache(maxsize=None)
+def _font(size: int, weight: str = "normal", family: Optional[str] = Theme.FONT_FAMILY) -> ctk.CTkFont:
+    """Font dùng chung — mỗi kiểu chữ chỉ tạo một CTkFont (cần cửa sổ Tk đã tồn tại)"""
+    return ctk.CTkFont(family=family, size=size, weight=weight)
+
+
+class _SafeNameFilter(dict):
+    """
+    Bảng str.translate cho tên file: giữ chữ/số (kể cả tiếng Việt), khoảng trắng,
+    '-' và '_', bỏ ký tự khác — điền dần khi gặp ký tự mới
+    """
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        result = codepoint if char.isalnum() or char in ' -_' else None
+        self[codepoint] = result
+        return result
+
+
+_SAFE_NAME_TABLE = _SafeNameFilter()
+
+
+class _LogDequeHandler(logging.Handler):
+    """Đưa log của các module vào deque của ô nhật ký (append của deque an toàn giữa các luồng)"""
+
+    def __init__(self, sink: deque):
+        super().__init__()
+        self._append = sink.append
+
+    def emit(self, record: logging.LogRecord):
+        self._append(record.getMessage())
+
+
+# Kiểu dựng sẵn cho dòng của bảng dữ liệu: nền dòng chẵn / lẻ (chọn bằng i & 1)
+ROW_KW = (
+    {'fg_color': Theme.BG_CARD},
+    {'fg_color': Theme.BG_INPUT},
+)
+CB_KW = {
+    'text_color': Theme.TEXT_PRIMARY,
+    'fg_color': Theme.PRIMARY,
+    'hover_color': Theme.PRIMARY_HOVER,
+    'border_color': Theme.BORDER,
+}
+
+
 # ═══════════════════════════════════════════════════════════════
 # ỨNG DỤNG CHÍNH
 # ═══════════════════════════════════════════════════════════════
@@ -86,7 +180,7 @@ class TTSApp(ctk.CTk):
         self.excel_processor = ExcelProcessor()
         self.tts_engine = TTSEngine()
         self.subtitle_composer = SubtitleComposer()
-        self.audio_player = AudioPlayer()
+        self.audio_player = create_audio_player()
         self.audiobook_merger = AudiobookMerger()
 
         # Callbacks
@@ -100,11 +194,47 @@ class TTSApp(ctk.CTk):
         self.is_processing = False
         self.current_file_path = None
         self.current_preview_audio = None
-        self.row_checkboxes = []  # [(BooleanVar, row_data), ...]
+        self._preview_queue = queue.Queue(maxsize=PREVIEW_QUEUE_SIZE)  # (lượt, đường dẫn | None)
+        self._preview_slots = cycle([
+            self.temp_folder / f"preview_{i}.mp3" for i in range(PREVIEW_SLOTS)
+        ])
+        self._preview_generation = 0   # Tăng mỗi lần nghe thử mới / dừng
+        self._preview_producer = None  # Lượt của luồng tạo audio mới nhất (giữ nút nghe thử)
+        self._preview_waiting = False  # Đang chờ câu kế tiếp để phát
+        self._slider_values = {}       # Giá trị slider đang chờ áp dụng
+        self.parallel_workers = BATCH_WORKERS
+        # Pool dùng chung cho mọi lần chuyển đổi (luồng chỉ được tạo khi cần),
+        # mỗi lần chỉ đưa vào tối đa parallel_workers phần cùng lúc
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(BATCH_WORKER_CHOICES[-1]), thread_name_prefix="tts-batch"
+        )
+        self._shutdown = threading.Event()  # Đặt khi đóng app: bỏ qua các phần chưa chạy
+        self.rate_bucket = TokenBucket(rate=BATCH_REQUESTS_PER_SEC, capacity=BATCH_REQUEST_BURST)
+        # Khóa theo mã băm nội dung: hai phần trùng văn bản không tổng hợp cùng lúc
+        self._cache_locks = weakref.WeakValueDictionary()
+        self._cache_locks_guard = threading.Lock()
+        self.rows = []      # Dữ liệu các phần đã tải
+        self.selected = bytearray()  # 1 byte/dòng: 1 = đã chọn
+        self.selected_count = 0
+        self._selection_empty = None  # Màu label đếm hiện tại: None = chưa đặt
 
         # ── Xây dựng giao diện ──
         self._build_ui()
 
+        # Nhận sự kiện của player trên luồng giao diện
+        self.after(50, self._drain_player_events)
+
+        # Nhật ký của app và của các module đi chung một deque (append/popleft
+        # nguyên tử, không cần khóa), đổ vào ô nhật ký mỗi LOG_FLUSH_MS —
+        # gọi log() được từ mọi luồng
+        self._log_lines = deque()
+        self._log_handler = _LogDequeHandler(self._log_lines)
+        for name in MODULE_LOGGERS:
+            module_logger = logging.getLogger(name)
+            module_logger.setLevel(logging.INFO)
+            module_logger.addHandler(self._log_handler)
+        self.after(LOG_FLUSH_MS, self._drain_log_queue)
+
         # Cleanup khi đóng
         self.protocol("WM_DELETE_WINDOW", self._on_closing)
 
@@ -119,9 +249,15 @@ class TTSApp(ctk.CTk):
         self.grid_rowconfigure(0, weight=0)                   # Header
         self.grid_rowconfigure(1, weight=1)                   # Nội dung
 
+        # Lần vẽ đầu chỉ có header và nền sidebar, các panel được dựng ngay sau đó
         self._build_header()
-        self._build_sidebar()
-        self._build_main_panel()
+        self._sidebar_placeholder = ctk.CTkFrame(
+            self, fg_color=Theme.BG_CARD, corner_radius=0, width=320
+        )
+        self._sidebar_placeholder.grid(row=1, column=0, sticky="nsew")
+
+        self.after_idle(self._build_sidebar)
+        self.after(30, self._build_main_panel)
 
     # ─────────── HEADER ───────────
 
@@ -136,7 +272,7 @@ class TTSApp(ctk.CTk):
         title = ctk.CTkLabel(
             header,
             text="🎤  Vietnamese TTS Studio",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=22, weight="bold"),
+            font=_font(22, "bold"),
             text_color=Theme.TEXT_PRIMARY
         )
         title.grid(row=0, column=0, padx=25, pady=(18, 2), sticky="w")
@@ -144,7 +280,7 @@ class TTSApp(ctk.CTk):
         subtitle = ctk.CTkLabel(
             header,
             text="Chuyển văn bản tiếng Việt thành giọng nói chuyên nghiệp",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_MUTED
         )
         subtitle.grid(row=1, column=0, padx=25, pady=(0, 10), sticky="w")
@@ -153,7 +289,7 @@ class TTSApp(ctk.CTk):
         version = ctk.CTkLabel(
             header,
             text="v2.0",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=11),
+            font=_font(11),
             text_color=Theme.TEXT_MUTED,
             fg_color=Theme.BG_INPUT,
             corner_radius=6,
@@ -178,6 +314,8 @@ class TTSApp(ctk.CTk):
         # ── CARD: Nghe thử ──
         self._build_audio_preview(sidebar)
 
+        self._sidebar_placeholder.destroy()
+
     def _build_voice_config(self, parent):
         """Card cấu hình giọng đọc"""
         card = self._create_card(parent, "🎙️  Cấu hình giọng đọc")
@@ -187,13 +325,13 @@ class TTSApp(ctk.CTk):
         self.voice_var = ctk.StringVar(value="HoaiMy (Nữ)")
         voice_menu = ctk.CTkOptionMenu(
             card, variable=self.voice_var,
-            values=list(TTSEngine.VIETNAMESE_VOICES.keys()),
+            values=VOICE_NAMES,
             command=self._on_voice_change,
             fg_color=Theme.BG_INPUT,
             button_color=Theme.PRIMARY,
             button_hover_color=Theme.PRIMARY_HOVER,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13),
-            dropdown_font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(13),
+            dropdown_font=_font(12),
             corner_radius=8, height=36
         )
         voice_menu.pack(pady=(0, 16), padx=16, fill="x")
@@ -202,7 +340,7 @@ class TTSApp(ctk.CTk):
         self._add_label(card, "Tốc độ đọc")
         self.rate_label = ctk.CTkLabel(
             card, text="0%",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_ACCENT
         )
         self.rate_label.pack(anchor="e", padx=16)
@@ -212,7 +350,7 @@ class TTSApp(ctk.CTk):
         self._add_label(card, "Cao độ giọng")
         self.pitch_label = ctk.CTkLabel(
             card, text="0 Hz",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_ACCENT
         )
         self.pitch_label.pack(anchor="e", padx=16)
@@ -222,7 +360,7 @@ class TTSApp(ctk.CTk):
         self._add_label(card, "Âm lượng tạo file")
         self.volume_label = ctk.CTkLabel(
             card, text="100%",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_ACCENT
         )
         self.volume_label.pack(anchor="e", padx=16)
@@ -236,7 +374,7 @@ class TTSApp(ctk.CTk):
         self._add_label(card, "Nhập văn bản thử")
         self.test_text = ctk.CTkTextbox(
             card, height=80,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             fg_color=Theme.BG_INPUT,
             border_color=Theme.BORDER,
             border_width=1,
@@ -255,7 +393,7 @@ class TTSApp(ctk.CTk):
             text="▶  Tạo và nghe thử",
             command=self._generate_and_play_preview,
             height=40,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13, weight="bold"),
+            font=_font(13, "bold"),
             fg_color=Theme.SUCCESS,
             hover_color=Theme.SUCCESS_HOVER,
             corner_radius=8
@@ -272,7 +410,7 @@ class TTSApp(ctk.CTk):
             command=self._play_audio,
             fg_color=Theme.PRIMARY, hover_color=Theme.PRIMARY_HOVER,
             corner_radius=8, state="disabled",
-            font=ctk.CTkFont(size=14)
+            font=_font(14, family=None)
         )
         self.play_btn.grid(row=0, column=0, padx=2)
 
@@ -281,7 +419,7 @@ class TTSApp(ctk.CTk):
             command=self._pause_audio,
             fg_color=Theme.WARNING, hover_color="#d97706",
             corner_radius=8, state="disabled",
-            font=ctk.CTkFont(size=14)
+            font=_font(14, family=None)
         )
         self.pause_btn.grid(row=0, column=1, padx=2)
 
@@ -290,7 +428,7 @@ class TTSApp(ctk.CTk):
             command=self._stop_audio,
             fg_color=Theme.DANGER, hover_color=Theme.DANGER_HOVER,
             corner_radius=8, state="disabled",
-            font=ctk.CTkFont(size=14)
+            font=_font(14, family=None)
         )
         self.stop_btn.grid(row=0, column=2, padx=2)
 
@@ -298,7 +436,7 @@ class TTSApp(ctk.CTk):
         self._add_label(card, "🔊 Âm lượng phát")
         self.playback_vol_label = ctk.CTkLabel(
             card, text="100%",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_ACCENT
         )
         self.playback_vol_label.pack(anchor="e", padx=16)
@@ -309,7 +447,7 @@ class TTSApp(ctk.CTk):
         # Trạng thái phát
         self.audio_status = ctk.CTkLabel(
             card, text="⏹  Đã dừng",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_MUTED
         )
         self.audio_status.pack(pady=(4, 16), padx=16)
@@ -339,7 +477,7 @@ class TTSApp(ctk.CTk):
         ctk.CTkLabel(
             toolbar,
             text="📂  Tải file dữ liệu",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13, weight="bold"),
+            font=_font(13, "bold"),
             text_color=Theme.TEXT_SECONDARY
         ).grid(row=0, column=0, padx=16, pady=(14, 0), sticky="w", columnspan=3)
 
@@ -347,33 +485,33 @@ class TTSApp(ctk.CTk):
         file_row.grid(row=1, column=0, columnspan=3, sticky="ew", padx=16, pady=(6, 12))
         file_row.grid_columnconfigure(2, weight=1)
 
-        csv_btn = ctk.CTkButton(
+        self.csv_btn = ctk.CTkButton(
             file_row,
             text="📊  Tải CSV / Excel",
             command=self._load_excel_file,
             width=170, height=40,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13, weight="bold"),
+            font=_font(13, "bold"),
             fg_color=Theme.PRIMARY,
             hover_color=Theme.PRIMARY_HOVER,
             corner_radius=8
         )
-        csv_btn.grid(row=0, column=0, padx=(0, 8))
+        self.csv_btn.grid(row=0, column=0, padx=(0, 8))
 
-        txt_btn = ctk.CTkButton(
+        self.txt_btn = ctk.CTkButton(
             file_row,
             text="📄  Tải file Text",
             command=self._load_text_file,
             width=150, height=40,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13, weight="bold"),
+            font=_font(13, "bold"),
             fg_color=Theme.SECONDARY,
             hover_color="#7c3aed",
             corner_radius=8
         )
-        txt_btn.grid(row=0, column=1, padx=(0, 12))
+        self.txt_btn.grid(row=0, column=1, padx=(0, 12))
 
         self.file_info = ctk.CTkLabel(
             file_row, text="Chưa tải file nào",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_MUTED
         )
         self.file_info.grid(row=0, column=2, sticky="w")
@@ -390,13 +528,13 @@ class TTSApp(ctk.CTk):
         ctk.CTkLabel(
             out_row,
             text="💾  Thư mục lưu file:",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13, weight="bold"),
+            font=_font(13, "bold"),
             text_color=Theme.TEXT_SECONDARY
         ).grid(row=0, column=0, padx=(0, 10))
 
         self.output_label = ctk.CTkLabel(
             out_row, text=str(self.output_folder),
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_ACCENT,
             anchor="w"
         )
@@ -407,7 +545,7 @@ class TTSApp(ctk.CTk):
             text="📁  Chọn thư mục khác",
             command=self._select_output_folder,
             width=170, height=34,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12, weight="bold"),
+            font=_font(12, "bold"),
             fg_color=Theme.SUCCESS,
             hover_color=Theme.SUCCESS_HOVER,
             corner_radius=8
@@ -429,7 +567,7 @@ class TTSApp(ctk.CTk):
         ctk.CTkLabel(
             header,
             text="📋  Chọn các phần cần chuyển đổi",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=15, weight="bold"),
+            font=_font(15, "bold"),
             text_color=Theme.TEXT_PRIMARY
         ).grid(row=0, column=0, sticky="w")
 
@@ -437,7 +575,7 @@ class TTSApp(ctk.CTk):
         self.selection_count = ctk.CTkLabel(
             header,
             text="Đã chọn: 0 / 0 phần",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_MUTED
         )
         self.selection_count.grid(row=0, column=1, sticky="e", padx=(10, 8))
@@ -448,7 +586,7 @@ class TTSApp(ctk.CTk):
             text="✅ Chọn tất cả",
             command=self._select_all,
             width=115, height=28,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=11),
+            font=_font(11),
             fg_color=Theme.SUCCESS,
             hover_color=Theme.SUCCESS_HOVER,
             corner_radius=6
@@ -461,29 +599,49 @@ class TTSApp(ctk.CTk):
             text="❌ Bỏ chọn",
             command=self._deselect_all,
             width=100, height=28,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=11),
+            font=_font(11),
             fg_color=Theme.DANGER,
             hover_color=Theme.DANGER_HOVER,
             corner_radius=6
         )
         desel_btn.grid(row=0, column=3)
 
-        # ── Danh sách phần (scrollable) ──
-        self.data_scroll = ctk.CTkScrollableFrame(
-            table_card,
-            fg_color=Theme.BG_INPUT,
-            corner_radius=8
+        # ── Danh sách phần (ảo hóa: chỉ tạo widget cho các dòng đang hiện) ──
+        list_frame = ctk.CTkFrame(table_card, fg_color=Theme.BG_INPUT, corner_radius=8)
+        list_frame.grid(row=1, column=0, sticky="nsew", padx=16, pady=(0, 14))
+        list_frame.grid_columnconfigure(0, weight=1)
+        list_frame.grid_rowconfigure(0, weight=1)
+
+        self._row_height = round(ROW_HEIGHT * ctk.ScalingTracker.get_widget_scaling(self))
+        self.data_canvas = ctk.CTkCanvas(
+            list_frame,
+            bg=Theme.BG_INPUT,
+            highlightthickness=0,
+            yscrollincrement=self._row_height
         )
-        self.data_scroll.grid(row=1, column=0, sticky="nsew", padx=16, pady=(0, 14))
+        self.data_canvas.grid(row=0, column=0, sticky="nsew", padx=(8, 0), pady=8)
+
+        self.data_scrollbar = ctk.CTkScrollbar(list_frame, command=self.data_canvas.yview)
+        self.data_scrollbar.grid(row=0, column=1, sticky="ns", padx=(0, 4), pady=8)
+
+        self.data_canvas.configure(yscrollcommand=self._on_data_scroll)
+        self.data_canvas.bind("<Configure>", self._on_data_canvas_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(sequence, self._on_data_mousewheel, add="+")
+
+        # Pool widget dùng lại khi cuộn: [(frame, checkbox, canvas_item), ...]
+        self._row_pool = []
+        self._pool_index = []   # Chỉ số dòng đang gán cho từng widget (-1 = ẩn)
+        self._pool_parity = []  # Màu nền chẵn/lẻ hiện tại của từng widget
 
         # Placeholder khi chưa có dữ liệu
         self.placeholder = ctk.CTkLabel(
-            self.data_scroll,
+            list_frame,
             text="📂  Hãy tải file CSV, Excel hoặc Text để bắt đầu",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13),
+            font=_font(13),
             text_color=Theme.TEXT_MUTED
         )
-        self.placeholder.pack(pady=40)
+        self.placeholder.place(relx=0.5, y=40, anchor="n")
 
     def _build_processing_panel(self, parent):
         """Panel xử lý hàng loạt: nút chuyển đổi + progress"""
@@ -497,7 +655,7 @@ class TTSApp(ctk.CTk):
             text="🚀  Chuyển đổi MP3",
             command=self._process_selected,
             width=200, height=44,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=14, weight="bold"),
+            font=_font(14, "bold"),
             fg_color=Theme.PRIMARY,
             hover_color=Theme.PRIMARY_HOVER,
             corner_radius=10
@@ -510,7 +668,7 @@ class TTSApp(ctk.CTk):
             proc_card,
             text="Tạo master audiobook (gộp 1 file + chapter markers)",
             variable=self.create_master_var,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_SECONDARY,
             fg_color=Theme.PRIMARY,
             hover_color=Theme.PRIMARY_HOVER,
@@ -518,18 +676,44 @@ class TTSApp(ctk.CTk):
         )
         master_cb.grid(row=0, column=1, padx=10, pady=14, sticky="w")
 
+        # Số luồng chuyển đổi song song
+        workers_frame = ctk.CTkFrame(proc_card, fg_color="transparent")
+        workers_frame.grid(row=0, column=2, padx=(0, 16), pady=14)
+
+        ctk.CTkLabel(
+            workers_frame,
+            text="Song song:",
+            font=_font(12),
+            text_color=Theme.TEXT_SECONDARY
+        ).pack(side="left", padx=(0, 6))
+
+        self.workers_menu = ctk.CTkOptionMenu(
+            workers_frame,
+            values=BATCH_WORKER_CHOICES,
+            command=self._on_workers_change,
+            width=70, height=28,
+            font=_font(12),
+            dropdown_font=_font(12),
+            fg_color=Theme.BG_INPUT,
+            button_color=Theme.PRIMARY,
+            button_hover_color=Theme.PRIMARY_HOVER,
+            corner_radius=6
+        )
+        self.workers_menu.set(str(self.parallel_workers))
+        self.workers_menu.pack(side="left")
+
         # Thống kê
         self.stats_label = ctk.CTkLabel(
             proc_card,
             text="Tổng: 0  |  Thành công: 0  |  Thất bại: 0",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
+            font=_font(12),
             text_color=Theme.TEXT_MUTED
         )
-        self.stats_label.grid(row=0, column=2, padx=(0, 16), sticky="e")
+        self.stats_label.grid(row=0, column=3, padx=(0, 16), sticky="e")
 
         # Progress bar
         progress_frame = ctk.CTkFrame(proc_card, fg_color="transparent")
-        progress_frame.grid(row=1, column=0, columnspan=3, sticky="ew", padx=16, pady=(0, 12))
+        progress_frame.grid(row=1, column=0, columnspan=4, sticky="ew", padx=16, pady=(0, 12))
         progress_frame.grid_columnconfigure(0, weight=1)
 
         self.progress_bar = ctk.CTkProgressBar(
@@ -545,7 +729,7 @@ class TTSApp(ctk.CTk):
         self.progress_label = ctk.CTkLabel(
             progress_frame,
             text="0 / 0",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=11),
+            font=_font(11),
             text_color=Theme.TEXT_MUTED, width=70
         )
         self.progress_label.grid(row=0, column=1, padx=(10, 0))
@@ -560,16 +744,17 @@ class TTSApp(ctk.CTk):
         ctk.CTkLabel(
             log_card,
             text="📋  Nhật ký xử lý",
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=14, weight="bold"),
+            font=_font(14, "bold"),
             text_color=Theme.TEXT_PRIMARY
         ).grid(row=0, column=0, padx=16, pady=(12, 6), sticky="w")
 
         self.log_text = ctk.CTkTextbox(
             log_card,
-            font=ctk.CTkFont(family=Theme.FONT_MONO, size=11),
+            font=_font(11, family=Theme.FONT_MONO),
             fg_color=Theme.BG_INPUT,
             corner_radius=8,
-            border_width=0
+            border_width=0,
+            state="disabled"
         )
         self.log_text.grid(row=1, column=0, sticky="nsew", padx=16, pady=(0, 14))
 
@@ -588,7 +773,7 @@ class TTSApp(ctk.CTk):
 
         ctk.CTkLabel(
             card, text=title,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=14, weight="bold"),
+            font=_font(14, "bold"),
             text_color=Theme.TEXT_PRIMARY
         ).pack(pady=(14, 10), padx=16, anchor="w")
 
@@ -598,7 +783,7 @@ class TTSApp(ctk.CTk):
         """Thêm label nhỏ trong card"""
         ctk.CTkLabel(
             parent, text=text,
-            font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12, weight="bold"),
+            font=_font(12, "bold"),
             text_color=Theme.TEXT_SECONDARY
         ).pack(anchor="w", padx=16, pady=(4, 2))
 
@@ -625,26 +810,57 @@ class TTSApp(ctk.CTk):
         self.tts_engine.set_voice(choice)
         self.log(f"✅ Đã chọn giọng: {choice}")
 
+    def _on_workers_change(self, choice):
+        """Thay đổi số phần chuyển đổi song song (áp dụng cho lần chuyển đổi sau)"""
+        self.parallel_workers = int(choice)
+
     def _on_rate_change(self, value):
         """Thay đổi tốc độ"""
+        self._throttle_slider("rate", self._apply_rate, value)
+
+    def _on_pitch_change(self, value):
+        """Thay đổi cao độ"""
+        self._throttle_slider("pitch", self._apply_pitch, value)
+
+    def _on_volume_change(self, value):
+        """Thay đổi âm lượng tạo file"""
+        self._throttle_slider("volume", self._apply_volume, value)
+
+    def _on_playback_volume_change(self, value):
+        """Thay đổi âm lượng phát"""
+        self._throttle_slider("playback_volume", self._apply_playback_volume, value)
+
+    def _throttle_slider(self, name: str, apply, value):
+        """Ghi nhận giá trị mới nhất, chỉ hẹn áp dụng nếu chưa có lần nào đang chờ"""
+        pending = name in self._slider_values
+        self._slider_values[name] = value
+        if not pending:
+            self.after(SLIDER_THROTTLE_MS, self._flush_slider, name, apply)
+
+    def _flush_slider(self, name: str, apply):
+        """Áp dụng giá trị slider mới nhất"""
+        apply(self._slider_values.pop(name))
+
+    def _apply_rate(self, value):
+        """Áp dụng tốc độ cho engine"""
         rate = int(value)
         self.tts_engine.set_rate(rate)
         self.rate_label.configure(text=f"{rate:+d}%")
 
-    def _on_pitch_change(self, value):
-        """Thay đổi cao độ"""
+    def _apply_pitch(self, value):
+        """Áp dụng cao độ cho engine"""
         pitch = int(value)
         self.tts_engine.set_pitch(pitch)
         self.pitch_label.configure(text=f"{pitch:+d} Hz")
 
-    def _on_volume_change(self, value):
-        """Thay đổi âm lượng tạo file"""
+    def _apply_volume(self, value):
+        """Áp dụng âm lượng tạo file cho engine"""
         vol = int(value)
         self.tts_engine.set_volume(vol)
         self.volume_label.configure(text=f"{vol}%")
 
-    def _on_playback_volume_change(self, value):
-        """Thay đổi âm lượng phát"""
+    def _apply_playback_volume(self, value):
+        """Áp dụng âm lượng phát cho player"""
         vol = int(value)
         self.audio_player.set_volume(vol / 100.0)
         self.playback_vol_label.configure(text=f"{vol}%")
@@ -668,89 +884,188 @@ class TTSApp(ctk.CTk):
             self.stop_btn.configure(state="disabled")
 
     def _on_audio_finish(self):
-        """Khi phát xong audio"""
-        self.log("✅ Phát xong audio nghe thử")
+        """Khi phát xong một câu — phát câu kế tiếp nếu đã tạo xong"""
+        self._preview_waiting = True
+        self._play_next_preview_chunk()
+
+    def _drain_player_events(self):
+        """Chạy callback của player trên luồng Tk"""
+        self.audio_player.drain_events()
+        self.after(50, self._drain_player_events)
+
+    def _drain_log_queue(self):
+        """Ghi mọi dòng nhật ký đang chờ vào ô nhật ký bằng một lần insert"""
+        lines = []
+        pop = self._log_lines.popleft
+        while True:
+            try:
+                lines.append(pop())
+            except IndexError:
+                break
+
+        if lines:
+            self._write_log("\n".join(lines) + "\n")
+
+        self.after(LOG_FLUSH_MS, self._drain_log_queue)
 
     # ═══════════════════════════════════════════════════════════
     # XỬ LÝ SỰ KIỆN — BẢNG DỮ LIỆU
     # ═══════════════════════════════════════════════════════════
 
-    def _populate_data_table(self):
-        """Điền bảng dữ liệu với checkbox cho từng phần"""
-        # Xóa nội dung cũ
-        for widget in self.data_scroll.winfo_children():
-            widget.destroy()
-        self.row_checkboxes = []
-
-        rows = self.excel_processor.get_rows_for_processing()
-        if not rows:
-            # Hiện placeholder nếu không có dữ liệu
-            self.placeholder = ctk.CTkLabel(
-                self.data_scroll,
-                text="📂  Không tìm thấy dữ liệu trong file",
-                font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=13),
-                text_color=Theme.TEXT_MUTED
-            )
-            self.placeholder.pack(pady=40)
-            return
-
-        for i, row in enumerate(rows):
-            var = ctk.BooleanVar(value=True)
+    def _populate_data_table(self, rows):
+        """Điền bảng dữ liệu — widget chỉ được gán cho các dòng đang hiện"""
+        self.rows = rows
+        self.selected = bytearray(b'\x01' * len(rows))
+        self.selected_count = len(rows)
+
+        # Dữ liệu mới: mọi widget trong pool phải gán lại
+        self._pool_index = [-1] * len(self._row_pool)
+        for _, _, item in self._row_pool:
+            self.data_canvas.itemconfigure(item, state="hidden")
+
+        # Placeholder được giữ lại, chỉ ẩn/hiện — không tạo/hủy widget khi tải file
+        if rows:
+            self.placeholder.place_forget()
+        else:
+            self.placeholder.configure(text="📂  Không tìm thấy dữ liệu trong file")
+            self.placeholder.place(relx=0.5, y=40, anchor="n")
+
+        self.data_canvas.configure(scrollregion=(0, 0, 0, len(rows) * self._row_height))
+        self.data_canvas.yview_moveto(0)
+        self._render_visible_rows()
+        self._update_selection_count()
 
-            # Cắt ngắn text để hiện preview
-            text_preview = row['text'][:90].replace('\n', ' ').replace('\r', '')
-            if len(row['text']) > 90:
-                text_preview += '...'
-
-            # Tạo frame cho mỗi row
-            row_frame = ctk.CTkFrame(
-                self.data_scroll,
-                fg_color=Theme.BG_CARD if i % 2 == 0 else "transparent",
-                corner_radius=6
-            )
-            row_frame.pack(fill="x", padx=4, pady=1)
+    def _row_label(self, row) -> str:
+        """Nội dung hiển thị của một dòng trong bảng"""
+        return f"  [{row['id']}]  {row['title']}  (Phần {row['part']})  —  {row['preview']}"
 
+    def _ensure_row_pool(self, count: int):
+        """Tạo thêm widget cho pool đến khi đủ count dòng"""
+        width = self.data_canvas.winfo_width()
+        while len(self._row_pool) < count:
+            slot = len(self._row_pool)
+            row_frame = ctk.CTkFrame(self.data_canvas, corner_radius=6, **ROW_KW[slot & 1])
             cb = ctk.CTkCheckBox(
                 row_frame,
-                text=f"  [{row['id']}]  {row['title']}  (Phần {row['part']})  —  {text_preview}",
-                variable=var,
-                font=ctk.CTkFont(family=Theme.FONT_FAMILY, size=12),
-                text_color=Theme.TEXT_PRIMARY,
-                fg_color=Theme.PRIMARY,
-                hover_color=Theme.PRIMARY_HOVER,
-                border_color=Theme.BORDER,
-                command=self._update_selection_count
+                text="",
+                font=_font(12),
+                command=lambda slot=slot: self._toggle_row(self._pool_index[slot]),
+                **CB_KW
             )
             cb.pack(pady=5, padx=10, anchor="w", fill="x")
+            item = self.data_canvas.create_window(
+                0, 0, anchor="nw", window=row_frame,
+                width=width, height=self._row_height - 2, state="hidden"
+            )
+            self._row_pool.append((row_frame, cb, item))
+            self._pool_index.append(-1)
+            self._pool_parity.append(slot & 1)
+
+    def _render_visible_rows(self):
+        """Gán các dòng đang nằm trong vùng nhìn thấy cho widget trong pool"""
+        total = len(self.rows)
+        first = int(self.data_canvas.canvasy(0)) // self._row_height
+
+        for slot, (row_frame, cb, item) in enumerate(self._row_pool):
+            i = first + slot
+            if i >= total:
+                if self._pool_index[slot] != -1:
+                    self.data_canvas.itemconfigure(item, state="hidden")
+                    self._pool_index[slot] = -1
+                continue
+            if self._pool_index[slot] == i:
+                continue
+
+            # Chỉ đổi màu nền khi widget chuyển giữa dòng chẵn và lẻ
+            parity = i & 1
+            if parity != self._pool_parity[slot]:
+                row_frame.configure(**ROW_KW[parity])
+                self._pool_parity[slot] = parity
+
+            cb.configure(text=self._row_label(self.rows[i]))
+            if self.selected[i]:
+                cb.select()
+            else:
+                cb.deselect()
+            self.data_canvas.coords(item, 0, i * self._row_height)
+            self.data_canvas.itemconfigure(item, state="normal")
+            self._pool_index[slot] = i
+
+    def _on_data_scroll(self, first, last):
+        """Cập nhật thanh cuộn và các dòng hiển thị khi bảng cuộn"""
+        self.data_scrollbar.set(first, last)
+        self._render_visible_rows()
+
+    def _on_data_canvas_resize(self, event):
+        """Giãn widget theo chiều rộng bảng, bổ sung pool khi bảng cao thêm"""
+        self._ensure_row_pool(-(-event.height // self._row_height) + ROW_POOL_BUFFER)
+        for _, _, item in self._row_pool:
+            self.data_canvas.itemconfigure(item, width=event.width)
+        self._render_visible_rows()
+
+    def _on_data_mousewheel(self, event):
+        """Cuộn bảng bằng con lăn chuột khi con trỏ nằm trên bảng"""
+        canvas_path = str(self.data_canvas)
+        widget_path = str(event.widget)
+        if widget_path != canvas_path and not widget_path.startswith(canvas_path + "."):
+            return
+        if event.num in (4, 5):
+            units = -3 if event.num == 4 else 3
+        elif sys.platform == "darwin":
+            units = -event.delta
+        else:
+            units = -int(event.delta / 40)
+        self.data_canvas.yview_scroll(units, "units")
 
-            self.row_checkboxes.append((var, row))
+    def _get_selected_rows(self):
+        """Lấy danh sách các phần đã được chọn"""
+        return list(compress(self.rows, self.selected))
 
+    def _toggle_row(self, i: int):
+        """Đảo trạng thái chọn của dòng i (gọi từ checkbox)"""
+        if i < 0:
+            return
+        if self.selected[i]:
+            self.selected[i] = 0
+            self.selected_count -= 1
+        else:
+            self.selected[i] = 1
+            self.selected_count += 1
         self._update_selection_count()
 
-    def _get_selected_rows(self):
-        """Lấy danh sách các phần đã được chọn"""
-        return [row for var, row in self.row_checkboxes if var.get()]
+    def _set_all_selected(self, value: bool):
+        """Chọn / bỏ chọn toàn bộ, chỉ vẽ lại các checkbox đang hiện"""
+        n = len(self.rows)
+        self.selected[:] = (b'\x01' if value else b'\x00') * n
+        self.selected_count = n if value else 0
+        for slot, (_, cb, _) in enumerate(self._row_pool):
+            if self._pool_index[slot] == -1:
+                continue
+            if value:
+                cb.select()
+            else:
+                cb.deselect()
+        self._update_selection_count()
 
     def _select_all(self):
         """Chọn tất cả các phần"""
-        for var, _ in self.row_checkboxes:
-            var.set(True)
-        self._update_selection_count()
+        self._set_all_selected(True)
 
     def _deselect_all(self):
         """Bỏ chọn tất cả các phần"""
-        for var, _ in self.row_checkboxes:
-            var.set(False)
-        self._update_selection_count()
+        self._set_all_selected(False)
 
     def _update_selection_count(self):
         """Cập nhật label đếm số phần đã chọn"""
-        selected = len(self._get_selected_rows())
-        total = len(self.row_checkboxes)
-        self.selection_count.configure(
-            text=f"Đã chọn: {selected} / {total} phần",
-            text_color=Theme.SUCCESS if selected > 0 else Theme.DANGER
-        )
+        selected = self.selected_count
+        total = len(self.rows)
+
+        # Chỉ đổi màu khi chuyển giữa "không chọn gì" và "có chọn"
+        now_empty = selected == 0
+        if now_empty != self._selection_empty:
+            self.selection_count.configure(text_color=Theme.DANGER if now_empty else Theme.SUCCESS)
+            self._selection_empty = now_empty
+        self.selection_count.configure(text=f"Đã chọn: {selected} / {total} phần")
 
     # ═══════════════════════════════════════════════════════════
     # XỬ LÝ SỰ KIỆN — TẢI FILE
@@ -769,27 +1084,33 @@ class TTSApp(ctk.CTk):
         )
 
         if file_path:
-            if self.excel_processor.load_excel(file_path):
-                self.current_file_path = file_path
-                row_count = self.excel_processor.get_row_count()
-                self.file_info.configure(
-                    text=f"✅  {Path(file_path).name}  ({row_count} phần)",
-                    text_color=Theme.SUCCESS
-                )
-                self.log(f"📊 Đã tải: {Path(file_path).name} ({row_count} phần)")
+            # Chỉ đọc các cột dùng cho TTS, bỏ qua cột bản gốc / bản nháp
+            loader = partial(self.excel_processor.load_excel, columns=ExcelProcessor.TEXT_COLUMNS)
+            self._load_in_background(loader, file_path, self._on_excel_loaded)
+
+    def _on_excel_loaded(self, ok: bool, file_path: str, rows):
+        """Cập nhật giao diện sau khi tải xong file CSV/Excel"""
+        if ok:
+            self.current_file_path = file_path
+            row_count = self.excel_processor.get_row_count()
+            self.file_info.configure(
+                text=f"✅  {Path(file_path).name}  ({row_count} phần)",
+                text_color=Theme.SUCCESS
+            )
+            self.log(f"📊 Đã tải: {Path(file_path).name} ({row_count} phần)")
 
-                # Điền bảng chọn phần
-                self._populate_data_table()
+            # Điền bảng chọn phần
+            self._populate_data_table(rows)
 
-                # Cập nhật thống kê
-                self._update_stats(total=row_count, processed=0, failed=0)
-            else:
-                messagebox.showerror(
-                    "Lỗi tải file",
-                    "Không thể đọc file. Vui lòng kiểm tra định dạng file.\n\n"
-                    "Yêu cầu các cột: ID, Title, Part, Source Text (Chinese), "
-                    "QuickTrans (Draft), AI Result (Vietnamese)"
-                )
+            # Cập nhật thống kê
+            self._update_stats(total=row_count, processed=0, failed=0)
+        else:
+            self.file_info.configure(text="❌  Không thể đọc file", text_color=Theme.DANGER)
+            messagebox.showerror(
+                "Lỗi tải file",
+                "Không thể đọc file. Vui lòng kiểm tra định dạng file.\n\n"
+                f"Yêu cầu các cột: {', '.join(ExcelProcessor.TEXT_COLUMNS)}"
+            )
 
     def _load_text_file(self):
         """Tải file text"""
@@ -799,21 +1120,51 @@ class TTSApp(ctk.CTk):
         )
 
         if file_path:
-            if self.excel_processor.load_text_file(file_path):
-                self.current_file_path = file_path
-                self.file_info.configure(
-                    text=f"✅  {Path(file_path).name}",
-                    text_color=Theme.SUCCESS
-                )
-                self.log(f"📄 Đã tải: {Path(file_path).name}")
+            self._load_in_background(self.excel_processor.load_text_file, file_path, self._on_text_loaded)
+
+    def _on_text_loaded(self, ok: bool, file_path: str, rows):
+        """Cập nhật giao diện sau khi tải xong file text"""
+        if ok:
+            self.current_file_path = file_path
+            self.file_info.configure(
+                text=f"✅  {Path(file_path).name}",
+                text_color=Theme.SUCCESS
+            )
+            self.log(f"📄 Đã tải: {Path(file_path).name}")
 
-                # Điền bảng chọn phần
-                self._populate_data_table()
+            # Điền bảng chọn phần
+            self._populate_data_table(rows)
 
-                # Cập nhật thống kê
-                self._update_stats(total=1, processed=0, failed=0)
-            else:
-                messagebox.showerror("Lỗi tải file", "Không thể đọc file text.")
+            # Cập nhật thống kê
+            self._update_stats(total=1, processed=0, failed=0)
+        else:
+            self.file_info.configure(text="❌  Không thể đọc file", text_color=Theme.DANGER)
+            messagebox.showerror("Lỗi tải file", "Không thể đọc file text.")
+
+    def _load_in_background(self, loader, file_path: str, on_done):
+        """Đọc file trên luồng phụ để giao diện không bị treo, rồi gọi on_done trên luồng Tk"""
+        self.csv_btn.configure(state="disabled")
+        self.txt_btn.configure(state="disabled")
+        self.file_info.configure(
+            text=f"⏳  Đang tải {Path(file_path).name}...",
+            text_color=Theme.TEXT_MUTED
+        )
+
+        def _worker():
+            try:
+                ok = loader(file_path)
+                rows = self.excel_processor.get_rows_for_processing() if ok else []
+            except Exception:
+                ok, rows = False, []
+            self.after(0, lambda: self._finish_load(ok, file_path, rows, on_done))
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+    def _finish_load(self, ok: bool, file_path: str, rows, on_done):
+        """Mở lại nút tải file và cập nhật giao diện"""
+        self.csv_btn.configure(state="normal")
+        self.txt_btn.configure(state="normal")
+        on_done(ok, file_path, rows)
 
     def _select_output_folder(self):
         """Chọn thư mục lưu file output"""
@@ -828,47 +1179,127 @@ class TTSApp(ctk.CTk):
     # ═══════════════════════════════════════════════════════════
 
     def _generate_and_play_preview(self):
-        """Tạo và phát audio nghe thử"""
+        """Tạo và phát audio nghe thử — câu sau được tạo trong lúc câu trước đang phát"""
         test_text = self.test_text.get("1.0", "end").strip()
 
         if not test_text:
             messagebox.showwarning("Chưa có văn bản", "Vui lòng nhập văn bản cần nghe thử.")
             return
 
-        self.log("🎤 Đang tạo audio nghe thử...")
+        chunks = self._split_sentences(test_text)
+
+        self.log(f"🎤 Đang tạo audio nghe thử ({len(chunks)} câu)...")
         self.preview_btn.configure(state="disabled", text="⏳  Đang tạo...")
 
-        # Dừng audio cũ
+        # Dừng audio và lượt nghe thử cũ
+        self._cancel_preview()
         self.audio_player.stop()
+        self._preview_waiting = True
+        self._preview_producer = self._preview_generation
+
+        threading.Thread(
+            target=self._produce_preview_chunks,
+            args=(self._preview_generation, chunks),
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def _split_sentences(text: str):
+        """
+        Tách văn bản thành các đoạn để tạo trước: câu đầu đứng riêng để phát sớm,
+        các câu ngắn phía sau được gộp lại để mỗi yêu cầu TTS đủ dài
+        """
+        sentences = [sentence for sentence in SENTENCE_SPLIT_RE.split(text) if sentence]
+        chunks = sentences[:1]
+        for sentence in sentences[1:]:
+            if len(chunks) > 1 and len(chunks[-1]) < PREVIEW_MIN_CHUNK_CHARS:
+                chunks[-1] += " " + sentence
+            else:
+                chunks.append(sentence)
+        return chunks
 
-        def _thread():
-            try:
-                time.sleep(0.1)
-                preview_path = self.temp_folder / "preview.mp3"
+    def _produce_preview_chunks(self, generation: int, chunks):
+        """Luồng nền: tạo audio từng câu và đưa vào hàng đợi phát"""
+        try:
+            for chunk in chunks:
+                if generation != self._preview_generation:
+                    return
+
+                # Ghi đè file cũ nhất trong vòng, không tạo file mới mỗi câu
+                chunk_path = next(self._preview_slots)
                 result = self.tts_engine.generate_audio_sync(
-                    text=test_text,
-                    output_audio_path=str(preview_path),
+                    text=chunk,
+                    output_audio_path=str(chunk_path),
                     progress_callback=self.log
                 )
 
-                if result['success']:
-                    self.current_preview_audio = preview_path
-                    self.log(f"✅ Đã tạo audio nghe thử")
-
-                    if self.audio_player.load(str(preview_path)):
-                        self.audio_player.play()
-                        self.log("▶ Đang phát...")
-                    else:
-                        messagebox.showerror("Lỗi", "Không thể phát audio nghe thử")
-                else:
-                    messagebox.showerror(
-                        "Lỗi tạo audio",
-                        f"Không thể tạo audio: {result.get('error', 'Không rõ nguyên nhân')}"
-                    )
-            finally:
-                self.preview_btn.configure(state="normal", text="▶  Tạo và nghe thử")
+                if not result['success']:
+                    error = result.get('error', 'Không rõ nguyên nhân')
+                    self.after(0, lambda: messagebox.showerror(
+                        "Lỗi tạo audio", f"Không thể tạo audio: {error}"
+                    ))
+                    return
+
+                if not self._put_preview_chunk(generation, chunk_path):
+                    return
+
+            # None báo hết câu
+            self._put_preview_chunk(generation, None)
+        finally:
+            self.after(0, self._on_preview_producer_done, generation)
+
+    def _on_preview_producer_done(self, generation: int):
+        """Mở lại nút nghe thử — chỉ khi luồng vừa xong là luồng mới nhất"""
+        if generation == self._preview_producer:
+            self._preview_producer = None
+            self.preview_btn.configure(state="normal", text="▶  Tạo và nghe thử")
+
+    def _put_preview_chunk(self, generation: int, chunk_path) -> bool:
+        """Đưa một câu vào hàng đợi (chờ khi đầy), bỏ qua nếu lượt đã bị hủy"""
+        while generation == self._preview_generation:
+            try:
+                self._preview_queue.put((generation, chunk_path), timeout=0.2)
+            except queue.Full:
+                continue
+            self.after(0, self._on_preview_chunk_ready)
+            return True
+        return False
+
+    def _on_preview_chunk_ready(self):
+        """Có câu mới trong hàng đợi — phát ngay nếu player đang chờ"""
+        if self._preview_waiting:
+            self._play_next_preview_chunk()
+
+    def _play_next_preview_chunk(self):
+        """Lấy câu kế tiếp của lượt hiện tại trong hàng đợi và phát"""
+        while True:
+            try:
+                generation, chunk_path = self._preview_queue.get_nowait()
+            except queue.Empty:
+                return
+            if generation == self._preview_generation:
+                break
+
+        self._preview_waiting = False
+        if chunk_path is None:
+            self.log("✅ Phát xong audio nghe thử")
+            return
 
-        threading.Thread(target=_thread, daemon=True).start()
+        self.current_preview_audio = chunk_path
+        if self.audio_player.load(str(chunk_path)):
+            self.audio_player.play()
+        else:
+            messagebox.showerror("Lỗi", "Không thể phát audio nghe thử")
+
+    def _cancel_preview(self):
+        """Hủy lượt nghe thử đang chạy và bỏ các câu đang chờ"""
+        self._preview_generation += 1
+        self._preview_waiting = False
+        while True:
+            try:
+                self._preview_queue.get_nowait()
+            except queue.Empty:
+                break
 
     def _play_audio(self):
         """Phát audio nghe thử"""
@@ -882,6 +1313,7 @@ class TTSApp(ctk.CTk):
 
     def _stop_audio(self):
         """Dừng audio"""
+        self._cancel_preview()
         self.audio_player.stop()
         self.log("⏹ Đã dừng")
 
@@ -920,97 +1352,204 @@ class TTSApp(ctk.CTk):
         self.log(f"🚀 BẮT ĐẦU CHUYỂN ĐỔI — {len(rows)} phần")
         self.log(f"{'═' * 60}\n")
 
+        # Đọc biến Tk trên luồng giao diện, luồng nền không chạm vào Tk
+        create_master = self.create_master_var.get()
+
         def _thread():
             try:
-                self._batch_process(rows)
+                self._batch_process(rows, create_master)
+            except Exception as e:
+                self.log(f"❌ Lỗi khi chuyển đổi: {e}")
+                self.after(0, partial(messagebox.showerror, "Lỗi chuyển đổi", str(e)))
             finally:
-                self.is_processing = False
-                self.process_btn.configure(state="normal", text="🚀  Chuyển đổi MP3")
+                # Cửa sổ đã đóng thì không còn gì để cập nhật
+                if not self._shutdown.is_set():
+                    self.after(0, self._on_batch_finished)
 
         threading.Thread(target=_thread, daemon=True).start()
 
-    def _batch_process(self, rows):
-        """Xử lý hàng loạt các phần đã chọn"""
+    def _on_batch_finished(self):
+        """Mở lại nút chuyển đổi khi xử lý xong (chạy trên luồng Tk)"""
+        self.is_processing = False
+        self.process_btn.configure(state="normal", text="🚀  Chuyển đổi MP3")
+
+    @staticmethod
+    def _store_in_cache(src: str, dest: str):
+        """Chép file vào bộ nhớ đệm qua file tạm để không bao giờ để lại file dở dang"""
+        tmp = f"{dest}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _batch_process(self, rows, create_master: bool):
+        """Xử lý hàng loạt các phần đã chọn (chạy trên luồng nền, cập nhật UI qua after)"""
         total = len(rows)
         processed = 0
         failed = 0
 
-        # Tạo thư mục output
+        # Tạo thư mục output một lần trước khi chia việc cho các luồng,
+        # engine ghi nhận để không gọi mkdir lại cho từng phần
         audio_dir = self.output_folder / "audio"
         subtitle_dir = self.output_folder / "subtitles"
-        audio_dir.mkdir(parents=True, exist_ok=True)
-        subtitle_dir.mkdir(parents=True, exist_ok=True)
+        self.tts_engine.prepare_output_dirs(audio_dir, subtitle_dir)
 
         # Xóa subtitle composer
         self.subtitle_composer.clear()
 
-        for idx, row in enumerate(rows, 1):
-            # Cập nhật tiến trình
-            progress = idx / total
-            self.progress_bar.set(progress)
-            self.progress_label.configure(text=f"{idx} / {total}")
-
-            # Tạo tên file
-            filename = f"{row['id']}_{row['title']}_Part{row['part']}"
-            filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).strip()
-
-            audio_path = audio_dir / f"{filename}.mp3"
-            subtitle_path = subtitle_dir / f"{filename}.srt"
+        # Tên file an toàn và đường dẫn (chuỗi) tính một lần cho mỗi phần, dùng lại ở mọi bước sau
+        for row in rows:
+            safe_name = self._output_name(row)
+            row['_safe_name'] = safe_name
+            row['_audio_path'] = str(audio_dir / f"{safe_name}.mp3")
+            row['_srt_path'] = str(subtitle_dir / f"{safe_name}.srt")
+
+        # Dùng chung cho mọi luồng: dịch vụ lỗi liên tiếp thì bỏ qua ngay các phần còn lại
+        breaker = CircuitBreaker(threshold=5, reset_timeout=60)
+
+        # Bộ nhớ đệm theo nội dung (giữ qua các lần chạy): văn bản trùng nhau
+        # với cùng giọng/tốc độ/cao độ/âm lượng thì chép file thay vì gọi TTS lại
+        cache_dir = self.output_folder / ".tts_cache"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Chụp cài đặt giọng một lần: khóa cache và lệnh tổng hợp dùng cùng giá trị,
+        # kéo thanh trượt giữa chừng không làm sai bộ nhớ đệm
+        settings = self.tts_engine.voice_settings()
+        voice_key = "{voice}|{rate}|{pitch}|{volume}\n".format(**settings)
+
+        def _process_one(idx, row):
+            """Chuyển đổi một phần (chạy trong pool), trả về thời lượng hoặc None nếu lỗi"""
+            digest = hashlib.blake2b(
+                (voice_key + row['text']).encode('utf-8'), digest_size=16
+            ).hexdigest()
+            with self._cache_locks_guard:
+                lock = self._cache_locks.get(digest)
+                if lock is None:
+                    lock = self._cache_locks[digest] = threading.Lock()
+            with lock:
+                return _synthesize(idx, row, cache_dir / digest)
+
+        def _synthesize(idx, row, cache_base: Path):
+            """Lấy audio từ bộ nhớ đệm hoặc tổng hợp mới, trả về thời lượng hoặc None"""
+            filename = row['_safe_name']
+            audio_path = row['_audio_path']
+            subtitle_path = row['_srt_path']
+            cached_audio = str(cache_base) + ".mp3"
+            cached_srt = str(cache_base) + ".srt"
 
             self.log(f"\n[{idx}/{total}] Đang xử lý: {filename}")
 
-            # Thử lại với exponential backoff
+            if os.path.exists(cached_audio) and os.path.exists(cached_srt):
+                try:
+                    shutil.copyfile(cached_audio, audio_path)
+                    shutil.copyfile(cached_srt, subtitle_path)
+                    self.log(f"♻️ Trùng nội dung đã có — dùng lại: {filename}")
+                    return self.tts_engine.probe_audio_duration(audio_path)
+                except OSError as e:
+                    self.log(f"⚠️ Không đọc được bộ nhớ đệm, tổng hợp lại: {e}")
+
+            # Thử lại với backoff ngẫu nhiên (full jitter) để các luồng không thử lại cùng lúc
             max_retries = 3
-            success = False
+            duration = None
 
             for retry in range(max_retries):
+                if self._shutdown.is_set():
+                    break
+                if not breaker.allow_request():
+                    self.log(f"⚡ Circuit open — bỏ qua: {filename}")
+                    break
+
                 try:
+                    self.rate_bucket.acquire()
                     result = self.tts_engine.generate_audio_sync(
                         text=row['text'],
-                        output_audio_path=str(audio_path),
-                        output_subtitle_path=str(subtitle_path),
-                        progress_callback=self.log
+                        output_audio_path=audio_path,
+                        output_subtitle_path=subtitle_path,
+                        progress_callback=self.log,
+                        settings=settings
                     )
 
                     if result['success']:
-                        processed += 1
-                        success = True
-
-                        # Thêm vào subtitle composer
-                        estimated_duration = len(row['text']) / 15
-                        self.subtitle_composer.add_chapter(
-                            str(subtitle_path),
-                            row['id'],
-                            estimated_duration
-                        )
+                        breaker.record_success()
+                        # Thời lượng thật của file audio cho subtitle composer
+                        duration = self.tts_engine.probe_audio_duration(audio_path)
+                        self._store_in_cache(audio_path, cached_audio)
+                        self._store_in_cache(subtitle_path, cached_srt)
                         break
                     else:
+                        breaker.record_failure()
                         error_msg = result.get('error', 'Lỗi không xác định')
                         if retry < max_retries - 1:
-                            wait_time = 2 ** retry
+                            wait_time = random.uniform(0, min(30, 2 ** retry))
                             self.log(f"⚠️ Lỗi: {error_msg}")
-                            self.log(f"⏳ Thử lại {retry + 2}/{max_retries} sau {wait_time}s...")
+                            self.log(f"⏳ Thử lại {retry + 2}/{max_retries} sau {wait_time:.1f}s...")
                             time.sleep(wait_time)
                         else:
                             self.log(f"❌ THẤT BẠI sau {max_retries} lần: {error_msg}")
-                            failed += 1
 
                 except Exception as e:
+                    breaker.record_failure()
                     if retry < max_retries - 1:
-                        wait_time = 2 ** retry
+                        wait_time = random.uniform(0, min(30, 2 ** retry))
                         self.log(f"⚠️ Lỗi: {str(e)}")
-                        self.log(f"⏳ Thử lại {retry + 2}/{max_retries} sau {wait_time}s...")
+                        self.log(f"⏳ Thử lại {retry + 2}/{max_retries} sau {wait_time:.1f}s...")
                         time.sleep(wait_time)
                     else:
                         self.log(f"❌ LỖI sau {max_retries} lần: {str(e)}")
-                        failed += 1
 
-            # Cập nhật thống kê
-            self._update_stats(total=total, processed=processed, failed=failed)
+            return duration
+
+        # Chuyển đổi song song trên pool dùng chung, cập nhật tiến trình theo thứ tự
+        # hoàn thành. Phần có thời lượng ước tính dài nhất bắt đầu trước (LPT) để
+        # phần dài không bị xếp cuối, chỉ số gốc vẫn dùng cho nhật ký và thứ tự ghép
+        durations = [None] * total
+        done = 0
+        longest_first = iter(sorted(range(total), key=lambda i: -rows[i]['est_duration']))
+        pending = {}
+
+        def _submit_next():
+            """Đưa phần kế tiếp vào pool (giữ tối đa parallel_workers phần đang chạy)"""
+            i = next(longest_first, None)
+            if i is None or self._shutdown.is_set():
+                return
+            try:
+                pending[self._pool.submit(_process_one, i + 1, rows[i])] = i
+            except RuntimeError:
+                # Pool đã đóng (app đang thoát)
+                pass
+
+        for _ in range(min(self.parallel_workers, total)):
+            _submit_next()
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = pending.pop(future)
+                duration = future.result()
+                done += 1
+                if duration is None:
+                    failed += 1
+                else:
+                    processed += 1
+                    durations[i] = duration
 
-            # Delay giữa các phần để tránh rate limit
-            if idx < total:
-                time.sleep(0.5)
+                if not self._shutdown.is_set():
+                    self.after(0, self._show_batch_progress, done, total, processed, failed)
+                _submit_next()
+
+        if self._shutdown.is_set():
+            return
+
+        # Thêm vào subtitle composer một lần, theo thứ tự gốc của các phần
+        # (không theo thứ tự hoàn thành của pool)
+        self.subtitle_composer.add_chapters_batch(
+            (row['_srt_path'], row['id'], duration)
+            for row, duration in zip(rows, durations)
+            if duration is not None
+        )
 
         # Tạo phụ đề tổng
         if processed > 0:
@@ -1020,19 +1559,19 @@ class TTSApp(ctk.CTk):
             self.subtitle_composer.compose_master_subtitle(str(master_subtitle_path))
 
         # Tạo master audiobook
-        if processed > 0 and self.create_master_var.get():
+        if processed > 0 and create_master:
             self.log(f"\n{'═' * 60}")
             self.log("📚 Đang tạo master audiobook với chapter markers...")
 
+            # Một lần liệt kê thư mục thay vì stat() từng file
+            with os.scandir(audio_dir) as entries:
+                present = {entry.name for entry in entries}
+
             audio_files = []
             for row in rows:
-                filename = f"{row['id']}_{row['title']}_Part{row['part']}"
-                filename = "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).strip()
-                audio_path = audio_dir / f"{filename}.mp3"
-
-                if audio_path.exists():
+                if f"{row['_safe_name']}.mp3" in present:
                     audio_files.append({
-                        'path': str(audio_path),
+                        'path': row['_audio_path'],
                         'title': row['title'],
                         'id': row['id']
                     })
@@ -1057,7 +1596,7 @@ class TTSApp(ctk.CTk):
         self.log(f"✅ Thành công: {processed}")
         self.log(f"❌ Thất bại: {failed}")
         self.log(f"📂 Thư mục: {self.output_folder}")
-        if self.create_master_var.get() and processed > 0:
+        if create_master and processed > 0:
             self.log(f"📚 Master audiobook: master_audiobook.mp3")
         self.log(f"{'═' * 60}\n")
 
@@ -1068,15 +1607,28 @@ class TTSApp(ctk.CTk):
             f"Thất bại: {failed}\n\n"
             f"Thư mục: {self.output_folder}"
         )
-        if self.create_master_var.get() and processed > 0:
+        if create_master and processed > 0:
             summary += "\n\n📚 Đã tạo master_audiobook.mp3 với chapter markers!"
 
-        messagebox.showinfo("Hoàn thành", summary)
+        # Hộp thoại Tk chỉ được mở trên luồng giao diện
+        self.after(0, partial(messagebox.showinfo, "Hoàn thành", summary))
 
     # ═══════════════════════════════════════════════════════════
     # TIỆN ÍCH
     # ═══════════════════════════════════════════════════════════
 
+    @staticmethod
+    def _output_name(row) -> str:
+        """Tên file đầu ra (không có đuôi) của một phần"""
+        filename = f"{row['id']}_{row['title']}_Part{row['part']}"
+        return filename.translate(_SAFE_NAME_TABLE).strip()
+
+    def _show_batch_progress(self, done: int, total: int, processed: int, failed: int):
+        """Cập nhật thanh tiến trình và thống kê (chạy trên luồng Tk)"""
+        self.progress_bar.set(done / total)
+        self.progress_label.configure(text=f"{done} / {total}")
+        self._update_stats(total=total, processed=processed, failed=failed)
+
     def _update_stats(self, total: int, processed: int, failed: int):
         """Cập nhật thống kê hiển thị"""
         self.stats_label.configure(
@@ -1084,21 +1636,51 @@ class TTSApp(ctk.CTk):
         )
 
     def log(self, message: str):
-        """Thêm dòng vào nhật ký"""
-        self.log_text.insert("end", message + "\n")
+        """Thêm dòng vào nhật ký (an toàn từ mọi luồng, được ghi theo lô)"""
+        self._log_lines.append(message)
+
+    def _write_log(self, text: str):
+        """Chèn text vào ô nhật ký (chỉ đọc), cắt bớt dòng cũ khi vượt giới hạn"""
+        self.log_text.configure(state="normal")
+        self.log_text.insert("end", text)
+        # Dòng cuối luôn trống (text kết thúc bằng '\n'), nên số dòng = line_count - 1
+        line_count = int(self.log_text.index("end-1c").split('.')[0])
+        if line_count > LOG_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - LOG_KEEP_LINES}.0")
+        self.log_text.configure(state="disabled")
         self.log_text.see("end")
-        self.update()
 
     def _on_closing(self):
         """Xử lý khi đóng ứng dụng"""
         self.audio_player.stop()
         self.audio_player.cleanup()
 
+        # Không nhận phần mới, rồi đóng engine: các yêu cầu TTS đang chạy bị hủy
+        # nên luồng của pool kết thúc ngay thay vì giữ tiến trình không thoát được
+        self._shutdown.set()
+        self._pool.shutdown(wait=False)
+        self.tts_engine.close()
+
+        for name in MODULE_LOGGERS:
+            logging.getLogger(name).removeHandler(self._log_handler)
+
+        # Đổi tên thư mục tạm (nguyên tử trên cùng ổ đĩa) rồi xóa ở luồng nền để
+        # cửa sổ đóng ngay; lần mở sau tạo lại vn_tts_preview mà không đụng thư
+        # mục đang bị xóa. Luồng không phải daemon nên tiến trình chỉ thoát khi
+        # đã xóa xong
+        doomed = self.temp_folder
         try:
-            if self.temp_folder.exists():
-                shutil.rmtree(self.temp_folder)
-        except Exception as e:
-            print(f"⚠️ Không thể xóa thư mục tạm: {e}")
+            doomed = self.temp_folder.rename(self.temp_folder.with_name(
+                f"{self.temp_folder.name}.del-{os.getpid()}-{time.time_ns()}"
+            ))
+        except OSError:
+            pass
+        threading.Thread(
+            target=shutil.rmtree,
+            args=(str(doomed),),
+            kwargs={'ignore_errors': True},
+            name="temp-cleanup"
+        ).start()
 
         self.destroy()
 